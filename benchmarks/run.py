@@ -0,0 +1,397 @@
+"""
+Throughput, queries per call and peak memory for every public crud function.
+
+Each operation runs against a table seeded with --rows parents and children,
+on in-memory and/or file-backed SQLite. Results can be written to JSON and
+compared with a baseline; query counts are deterministic, so any increase is
+reported as a regression, while timings only fail the comparison when
+--time-tolerance is given. Run with:
+
+    poetry run python -m benchmarks.run --rows 1000 100000
+    poetry run python -m benchmarks.run --compare benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import sqlalchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_crud import crud
+from tests.models_for_test import Base, Parent, Child
+
+
+class Case(NamedTuple):
+    run: Callable
+    # builds per-case state outside the timed loop, e.g. rows to delete
+    prepare: Optional[Callable] = None
+
+
+def _spread(rows: int, i: int) -> int:
+    # walk the table instead of hitting one hot row
+    return (i * 7919) % rows + 1
+
+
+def _new_parents(db, repeat: int, per_call: int = 1) -> List[int]:
+    models = crud.create_models(
+        db,
+        Parent,
+        ({"name": "bench_target", "id_modulo": -1} for _ in range(repeat * per_call)),
+        return_objects=True,
+    )
+    return [model.id for model in models]
+
+
+def _link_pairs(db, rows: int, repeat: int) -> List[tuple]:
+    pairs = [(n % rows + 1, n // rows % rows + 1) for n in range(repeat)]
+    for parent_id, child_id in pairs:
+        crud.link_many(db, Parent, parent_id, Child, [child_id], "children")
+    return pairs
+
+
+CASES: Dict[str, Case] = {
+    "get_models": Case(lambda db, rows, state, i: crud.get_models(db, Parent)),
+    # instances vs. row mode for the same 1000-row page
+    "get_models_1k": Case(
+        lambda db, rows, state, i: crud.get_models(db, Parent, limit=1000)
+    ),
+    "get_models_1k_tuple": Case(
+        lambda db, rows, state, i: crud.get_models(db, Parent, limit=1000, as_="tuple")
+    ),
+    "get_models_1k_namedtuple": Case(
+        lambda db, rows, state, i: crud.get_models(
+            db, Parent, limit=1000, as_="namedtuple"
+        )
+    ),
+    "get_models_1k_dict": Case(
+        lambda db, rows, state, i: crud.get_models(db, Parent, limit=1000, as_="dict")
+    ),
+    "get_models_filtered": Case(
+        lambda db, rows, state, i: crud.get_models(
+            db, Parent, filters={"id_modulo": i % 10, "id__gte": rows // 2}
+        )
+    ),
+    "get_models_with_count": Case(
+        lambda db, rows, state, i: crud.get_models(
+            db, Parent, filters={"id_modulo": i % 10}, with_count=True
+        )
+    ),
+    "count_models": Case(
+        lambda db, rows, state, i: crud.count_models(
+            db, Parent, filters={"id_modulo": i % 10}
+        )
+    ),
+    "exists_model": Case(
+        lambda db, rows, state, i: crud.exists_model(
+            db, Parent, filters={"id": _spread(rows, i)}
+        )
+    ),
+    "get_models_page": Case(
+        lambda db, rows, state, i: crud.get_models_page(db, Parent)
+    ),
+    "iter_models_1k": Case(
+        lambda db, rows, state, i: sum(
+            1 for _ in islice(crud.iter_models(db, Parent, chunk_size=500), 1000)
+        )
+    ),
+    "get_model": Case(
+        lambda db, rows, state, i: crud.get_model(db, Parent, _spread(rows, i))
+    ),
+    "get_models_by_ids_100": Case(
+        lambda db, rows, state, i: crud.get_models_by_ids(
+            db, Parent, [_spread(rows, i + n) for n in range(100)]
+        )
+    ),
+    "get_model_by_attribute": Case(
+        lambda db, rows, state, i: crud.get_model_by_attribute(
+            db, Parent, "id", _spread(rows, i)
+        )
+    ),
+    "get_models_by_attribute": Case(
+        lambda db, rows, state, i: crud.get_models_by_attribute(
+            db, Parent, "id_modulo", i % 10
+        )
+    ),
+    "get_models_by_attribute_page": Case(
+        lambda db, rows, state, i: crud.get_models_by_attribute_page(
+            db, Parent, "id_modulo", i % 10
+        )
+    ),
+    "create_model": Case(
+        lambda db, rows, state, i: crud.create_model(
+            db, Child, {"name": f"bench_child_{i}"}
+        )
+    ),
+    "create_models_1k": Case(
+        lambda db, rows, state, i: crud.create_models(
+            db, Child, ({"name": f"bench_child_{i}_{n}"} for n in range(1000))
+        )
+    ),
+    "upsert_models_100": Case(
+        lambda db, rows, state, i: crud.upsert_models(
+            db,
+            Parent,
+            [
+                {"id": _spread(rows, i + n), "name": f"bench_upsert_{i}"}
+                for n in range(100)
+            ],
+            conflict_on=["id"],
+        )
+    ),
+    "update_model": Case(
+        lambda db, rows, state, i: crud.update_model(
+            db, Parent, _spread(rows, i), {"name": f"bench_update_{i}"}
+        )
+    ),
+    "update_model_unchanged": Case(
+        lambda db, rows, state, i: crud.update_model(
+            db, Parent, _spread(rows, i), {"id_modulo": _spread(rows, i) % 10}
+        )
+    ),
+    "update_model_by_attribute": Case(
+        lambda db, rows, state, i: crud.update_model_by_attribute(
+            db, Parent, "id", _spread(rows, i), {"name": f"bench_update_{i}"}
+        )
+    ),
+    "update_models_100": Case(
+        lambda db, rows, state, i: crud.update_models(
+            db,
+            Parent,
+            [_spread(rows, i + n) for n in range(100)],
+            {"name": f"bench_update_{i}"},
+        )
+    ),
+    "update_models_by_attribute": Case(
+        lambda db, rows, state, i: crud.update_models_by_attribute(
+            db, Parent, "id", _spread(rows, i), {"name": f"bench_update_{i}"}
+        )
+    ),
+    "delete_model": Case(
+        lambda db, rows, state, i: crud.delete_model(db, Parent, state[i]),
+        prepare=lambda db, rows, repeat: _new_parents(db, repeat),
+    ),
+    "delete_models_10": Case(
+        lambda db, rows, state, i: crud.delete_models(
+            db, Parent, state[i * 10 : (i + 1) * 10]
+        ),
+        prepare=lambda db, rows, repeat: _new_parents(db, repeat, per_call=10),
+    ),
+    "delete_models_by_attribute": Case(
+        lambda db, rows, state, i: crud.delete_models_by_attribute(
+            db, Parent, "id", state[i]
+        ),
+        prepare=lambda db, rows, repeat: _new_parents(db, repeat),
+    ),
+    "link_models": Case(
+        lambda db, rows, state, i: crud.link_models(
+            db, Parent, _spread(rows, i), Child, _spread(rows, i + 1), "children"
+        )
+    ),
+    "unlink_models": Case(
+        lambda db, rows, state, i: crud.unlink_models(
+            db, Parent, state[i][0], Child, state[i][1], "children"
+        ),
+        prepare=_link_pairs,
+    ),
+    "link_many_100": Case(
+        lambda db, rows, state, i: crud.link_many(
+            db,
+            Parent,
+            _spread(rows, i),
+            Child,
+            [_spread(rows, i + n) for n in range(100)],
+            "children",
+        )
+    ),
+    "unlink_many_100": Case(
+        lambda db, rows, state, i: crud.unlink_many(
+            db,
+            Parent,
+            _spread(rows, i),
+            Child,
+            [_spread(rows, i + n) for n in range(100)],
+            "children",
+        )
+    ),
+}
+
+
+def _seed(path: str, rows: int) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    crud.create_models(
+        db,
+        Parent,
+        ({"name": f"parent_{n}", "id_modulo": n % 10} for n in range(1, rows + 1)),
+        batch_size=10000,
+    )
+    crud.create_models(
+        db,
+        Child,
+        ({"name": f"child_{n}"} for n in range(1, rows + 1)),
+        batch_size=10000,
+    )
+    db.close()
+    engine.dispose()
+
+
+def _engine(backend: str, template: str, directory: str) -> sqlalchemy.engine.Engine:
+    # every case starts from a copy of the seeded database, so destructive
+    # cases cannot affect the others and seeding happens only once
+    if backend == "file":
+        path = os.path.join(directory, "case.db")
+        shutil.copyfile(template, path)
+        return create_engine(f"sqlite:///{path}")
+
+    engine = create_engine("sqlite://")
+    source = sqlite3.connect(template)
+    connection = engine.raw_connection()
+    source.backup(connection.connection)
+    connection.close()
+    source.close()
+    return engine
+
+
+def run_case(
+    name: str, backend: str, rows: int, repeat: int, template: str, directory: str
+) -> dict:
+    case = CASES[name]
+    engine = _engine(backend, template, directory)
+    db = sessionmaker(bind=engine)()
+    state = case.prepare(db, rows, repeat + 1) if case.prepare else None
+    db.expunge_all()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        case.run(db, rows, state, i)
+    elapsed = time.perf_counter() - start
+
+    event.remove(engine, "before_cursor_execute", listener)
+
+    # memory is sampled on one extra call so tracing does not skew timings
+    db.expunge_all()
+    tracemalloc.start()
+    case.run(db, rows, state, repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    db.close()
+    engine.dispose()
+
+    return {
+        "backend": backend,
+        "rows": rows,
+        "operation": name,
+        "ops_per_sec": round(repeat / elapsed, 1),
+        "queries_per_op": len(statements) / repeat,
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results: List[dict], baseline: List[dict], time_tolerance) -> List[str]:
+    expected = {(r["backend"], r["rows"], r["operation"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        reference = expected.get(
+            (result["backend"], result["rows"], result["operation"])
+        )
+        if reference is None:
+            continue
+
+        label = f"{result['operation']} ({result['backend']}, {result['rows']} rows)"
+        if result["queries_per_op"] > reference["queries_per_op"]:
+            regressions.append(
+                f"{label}: {result['queries_per_op']} queries per call, "
+                f"baseline {reference['queries_per_op']}"
+            )
+        if time_tolerance is not None and result["ops_per_sec"] < reference[
+            "ops_per_sec"
+        ] * (1 - time_tolerance):
+            regressions.append(
+                f"{label}: {result['ops_per_sec']} ops/sec, "
+                f"baseline {reference['ops_per_sec']}"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000])
+    parser.add_argument(
+        "--backends", nargs="+", choices=["memory", "file"], default=["memory", "file"]
+    )
+    parser.add_argument("--operations", nargs="+", choices=sorted(CASES))
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        help="also fail when ops/sec drops by more than this fraction, e.g. 0.3",
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    print(
+        f"{'operation':<30}{'backend':>8}{'rows':>10}"
+        f"{'ops/sec':>12}{'queries/op':>12}{'peak KiB':>11}"
+    )
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            template = os.path.join(directory, "seed.db")
+            _seed(template, rows)
+
+            for backend in args.backends:
+                for name in args.operations or CASES:
+                    result = run_case(
+                        name, backend, rows, args.repeat, template, directory
+                    )
+                    results.append(result)
+                    print(
+                        f"{name:<30}{backend:>8}{rows:>10}"
+                        f"{result['ops_per_sec']:>12}{result['queries_per_op']:>12}"
+                        f"{result['peak_memory_kib']:>11}"
+                    )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "sqlalchemy": sqlalchemy.__version__,
+                    "repeat": args.repeat,
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.time_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Per-call overhead of attribute lookups with and without cached statements.
+
+The "query" column rebuilds a legacy Query on every call, as the crud
+functions did before statements were cached; the "crud" column calls the
+library functions. Run with:
+
+    poetry run python -m benchmarks.statement_cache
+"""
+
+import argparse
+import timeit
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_crud import crud
+from tests.models_for_test import Base, Parent
+
+
+def query_first(db, model, attribute, attribute_value):
+    if hasattr(model, attribute):
+        model_attribute = getattr(model, attribute)
+        return db.query(model).filter(model_attribute == attribute_value).first()
+    raise AttributeError
+
+
+def query_all(db, model, attribute, attribute_value, offset=0, limit=100):
+    if hasattr(model, attribute):
+        model_attribute = getattr(model, attribute)
+        return (
+            db.query(model)
+            .filter(model_attribute == attribute_value)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+    raise AttributeError
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    crud.create_models(
+        db,
+        Parent,
+        ({"name": f"parent_{i}", "id_modulo": i % 10} for i in range(1, 1001)),
+    )
+
+    cases = {
+        "first by primary key": (
+            lambda: query_first(db, Parent, "id", 500),
+            lambda: crud.get_model_by_attribute(db, Parent, "id", 500),
+        ),
+        "all by attribute (limit 10)": (
+            lambda: query_all(db, Parent, "id_modulo", 3, limit=10),
+            lambda: crud.get_models_by_attribute(db, Parent, "id_modulo", 3, limit=10),
+        ),
+    }
+
+    print(f"{'case':<30}{'query us/call':>15}{'crud us/call':>15}")
+    for name, (before, after) in cases.items():
+        before(), after()  # warm up compiled caches for both paths
+        before_us = timeit.timeit(before, number=args.calls) / args.calls * 1e6
+        after_us = timeit.timeit(after, number=args.calls) / args.calls * 1e6
+        print(f"{name:<30}{before_us:>15.1f}{after_us:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import functools
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Type
+
+import sqlalchemy
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import DeclarativeMeta
+
+from sqlalchemy_crud import crud
+
+
+def _run_sync(func, **defaults):
+    # AsyncSession.run_sync drives the sync implementation inside SQLAlchemy's
+    # greenlet bridge, so the event loop is never blocked on database IO
+    @functools.wraps(func)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(func, *args, **{**defaults, **kwargs})
+
+    return wrapper
+
+
+get_models = _run_sync(crud.get_models)
+get_models_page = _run_sync(crud.get_models_page)
+count_models = _run_sync(crud.count_models)
+exists_model = _run_sync(crud.exists_model)
+get_model = _run_sync(crud.get_model)
+get_models_by_ids = _run_sync(crud.get_models_by_ids)
+get_model_by_attribute = _run_sync(crud.get_model_by_attribute)
+get_models_by_attribute = _run_sync(crud.get_models_by_attribute)
+get_models_by_attribute_page = _run_sync(crud.get_models_by_attribute_page)
+# an AsyncSession cannot lazy load, so writes returning an instance load the
+# server-generated columns the flush did not return before handing it back
+create_model = _run_sync(crud.create_model, refresh=True)
+create_models = _run_sync(crud.create_models)
+upsert_models = _run_sync(crud.upsert_models)
+update_model = _run_sync(crud.update_model, refresh=True)
+update_model_by_attribute = _run_sync(crud.update_model_by_attribute, refresh=True)
+update_models = _run_sync(crud.update_models)
+update_models_by_attribute = _run_sync(crud.update_models_by_attribute)
+delete_model = _run_sync(crud.delete_model)
+delete_models = _run_sync(crud.delete_models)
+delete_models_by_attribute = _run_sync(crud.delete_models_by_attribute)
+link_models = _run_sync(crud.link_models, refresh=True)
+unlink_models = _run_sync(crud.unlink_models, refresh=True)
+link_many = _run_sync(crud.link_many)
+unlink_many = _run_sync(crud.unlink_many)
+
+
+@asynccontextmanager
+async def unit_of_work(db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    depth = await db.run_sync(crud._enter_unit_of_work)
+    try:
+        yield db
+    except BaseException:
+        await db.run_sync(crud._exit_unit_of_work, depth, True)
+        raise
+    await db.run_sync(crud._exit_unit_of_work, depth, False)
+
+
+async def iter_models(
+    db: AsyncSession,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    attribute: Optional[str] = None,
+    attribute_value=None,
+    chunk_size: int = 1000,
+    filters: Optional[dict] = None,
+) -> AsyncIterator[DeclarativeMeta]:
+    if attribute is not None:
+        filters = {**(filters or {}), attribute: attribute_value}
+
+    if db.bind is not None and db.bind.dialect.supports_server_side_cursors:
+        db_models = _iter_server_side(db, model, filters, chunk_size)
+    else:
+        db_models = _iter_keyset(db, model, filters, chunk_size)
+
+    async for db_model in db_models:
+        yield db_model
+        if db_model in db:
+            db.expunge(db_model)
+
+
+async def _iter_server_side(
+    db: AsyncSession,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    filters: Optional[dict],
+    chunk_size: int,
+) -> AsyncIterator[DeclarativeMeta]:
+    statement = (
+        sqlalchemy.select(model)
+        .where(*crud._filter_criteria(model, filters))
+        .order_by(*crud._primary_key(model))
+    )
+
+    result = await db.stream(statement.execution_options(max_row_buffer=chunk_size))
+    async for db_model in result.scalars():
+        yield db_model
+
+
+async def _iter_keyset(
+    db: AsyncSession,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    filters: Optional[dict],
+    chunk_size: int,
+) -> AsyncIterator[DeclarativeMeta]:
+    after = None
+    while True:
+        db_models, after = await get_models_page(
+            db, model, after=after, limit=chunk_size, filters=filters
+        )
+
+        for db_model in db_models:
+            yield db_model
+
+        if after is None:
+            return
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class CacheBackend:
+    """
+    Storage used by the crud read functions to cache rows between sessions.
+
+    Implementations only need get/set/delete/clear; values are plain dicts of
+    column values, so any store that can pickle them (e.g. Redis) will do.
+    get must return None on a miss.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class LRUCache(CacheBackend):
+    """
+    In-process cache bounded by entry count, with an optional time to live.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        super().__init__()
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value) -> None:
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(size=len(self._entries), evictions=self.evictions)
+        return stats
+
+    def __len__(self) -> int:
+        return len(self._entries)
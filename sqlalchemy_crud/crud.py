@@ -1,120 +1,753 @@
-from typing import List, Type, Union
+import base64
+import contextvars
+import datetime
+import decimal
+import functools
+import inspect
+import json
+import time
+import uuid
+import warnings
+from contextlib import contextmanager
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 import sqlalchemy
-from sqlalchemy.orm import Session, DeclarativeMeta
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, DeclarativeMeta, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm.util import identity_key
 
+from sqlalchemy_crud.cache import CacheBackend
+from sqlalchemy_crud.instrumentation import (
+    CallRecord,
+    QueryBudget,
+    QueryBudgetExceeded,
+    QueryBudgetWarning,
+)
+from sqlalchemy_crud.registry import CrudRegistry, ModelInfo
 
+_UNIT_OF_WORK = "sqlalchemy_crud.unit_of_work"
+_PENDING_INVALIDATIONS = "sqlalchemy_crud.pending_invalidations"
+_SAVEPOINTS = "sqlalchemy_crud.savepoints"
+_FLUSHED = "sqlalchemy_crud.flushed"
+
+_cache: Optional[CacheBackend] = None
+_registry = CrudRegistry()
+_listeners: List[Callable[[CallRecord], None]] = []
+_current_call: contextvars.ContextVar = contextvars.ContextVar(
+    "sqlalchemy_crud.current_call", default=None
+)
+_query_budgets: contextvars.ContextVar = contextvars.ContextVar(
+    "sqlalchemy_crud.query_budgets", default=()
+)
+
+
+def set_cache(cache: Optional[CacheBackend]) -> None:
+    global _cache
+    _cache = cache
+    if cache is not None:
+        _install_flush_listeners()
+
+
+def get_cache() -> Optional[CacheBackend]:
+    return _cache
+
+
+def get_registry() -> CrudRegistry:
+    return _registry
+
+
+class VersionConflictError(StaleDataError):
+    pass
+
+
+def set_version_column(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], attribute: Optional[str]
+) -> None:
+    # for models without a mapper version_id_col; only integer counters, as
+    # other values (timestamps in particular) do not reliably compare equal
+    # once bound again
+    info = _registry.get(model)
+    if attribute is None:
+        info.version = info.mapper.version_id_col
+        return
+
+    column = info.column(attribute)
+    if not isinstance(column.type, sqlalchemy.Integer):
+        raise ValueError(
+            f"{model.__name__}.{attribute} is not an integer column; "
+            "only integer counters can be used as version columns"
+        )
+    info.version = column
+
+
+def add_listener(listener: Callable[[CallRecord], None]) -> None:
+    _install_statement_listener()
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[CallRecord], None]) -> None:
+    _listeners.remove(listener)
+
+
+@contextmanager
+def query_budget(max_queries: int, action: str = "raise") -> Iterator[QueryBudget]:
+    # counts every statement sent from this thread or task while the block is
+    # open, including lazy loads triggered on returned models; usable as a
+    # decorator to put a budget on a whole function
+    if action not in ("raise", "warn"):
+        raise ValueError("action must be 'raise' or 'warn'")
+
+    _install_statement_listener()
+    budget = QueryBudget(max_queries)
+    token = _query_budgets.set(_query_budgets.get() + (budget,))
+    try:
+        yield budget
+    finally:
+        _query_budgets.reset(token)
+
+    if budget.exceeded:
+        if action == "raise":
+            raise QueryBudgetExceeded(budget.report())
+        warnings.warn(budget.report(), QueryBudgetWarning, stacklevel=3)
+
+
+def _install_statement_listener() -> None:
+    # a class-level engine event covers every engine; it is only installed
+    # once instrumentation or a query budget is actually used
+    if not sqlalchemy.event.contains(Engine, "before_cursor_execute", _on_statement):
+        sqlalchemy.event.listen(Engine, "before_cursor_execute", _on_statement)
+
+
+def _on_statement(connection, cursor, statement, *args) -> None:
+    call = _current_call.get()
+    if call is not None:
+        call.statements += 1
+
+    for budget in _query_budgets.get():
+        budget.statements.append(statement)
+
+
+def _row_count(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, int):
+        # bulk writers return the number of rows they affected
+        return result
+    if isinstance(result, tuple):
+        # (models, cursor) pages and (models, total) counts
+        result = result[0]
+    if isinstance(result, dict):
+        return len(result)
+    if isinstance(result, list):
+        return sum(1 for item in result if item is not None)
+    return 1
+
+
+def _one_row(result) -> int:
+    return 0 if result is None else 1
+
+
+def _instrumented(rows: Callable = _row_count):
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            return _instrumented_generator(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _listeners or _current_call.get() is not None:
+                return func(*args, **kwargs)
+
+            call = CallRecord(func.__name__, _model_argument(args, kwargs))
+            token = _current_call.set(call)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                call.rows = rows(result)
+                return result
+            except BaseException as exc:
+                call.error = exc
+                raise
+            finally:
+                call.elapsed = time.perf_counter() - start
+                _current_call.reset(token)
+                _notify(call)
+
+        return wrapper
+
+    return decorator
+
+
+def _instrumented_generator(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _listeners:
+            return func(*args, **kwargs)
+        return _record_iteration(
+            func(*args, **kwargs),
+            CallRecord(func.__name__, _model_argument(args, kwargs)),
+        )
+
+    return wrapper
+
+
+def _record_iteration(iterator: Iterator, call: CallRecord) -> Iterator:
+    # the call is only current while the generator itself runs, so queries
+    # the caller makes between items are not attributed to it
+    try:
+        while True:
+            token = _current_call.set(call)
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except BaseException as exc:
+                call.error = exc
+                raise
+            finally:
+                call.elapsed += time.perf_counter() - start
+                _current_call.reset(token)
+
+            call.rows += 1
+            yield item
+    finally:
+        iterator.close()
+        _notify(call)
+
+
+def _model_argument(args: tuple, kwargs: dict):
+    # every public function takes the session first and the model second
+    if len(args) > 1:
+        return args[1]
+    return kwargs.get("model", kwargs.get("parent_model"))
+
+
+def _notify(call: CallRecord) -> None:
+    for listener in list(_listeners):
+        listener(call)
+
+
+@contextmanager
+def unit_of_work(db: Session) -> Iterator[Session]:
+    # crud writes inside the block only flush; the outermost block commits
+    # once on success and rolls everything back if an exception escapes.
+    # A nested block runs in a savepoint, so an exception that escapes it
+    # undoes its writes even when an outer block catches the exception
+    depth = _enter_unit_of_work(db)
+    try:
+        yield db
+    except BaseException:
+        _exit_unit_of_work(db, depth, failed=True)
+        raise
+    _exit_unit_of_work(db, depth, failed=False)
+
+
+@_instrumented()
 def get_models(
     db: Session,
     model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
     offset: int = 0,
     limit: int = 100,
-) -> List[DeclarativeMeta]:
-    return db.query(model).offset(offset).limit(limit).all()
+    columns: Optional[List[str]] = None,
+    eager: Optional[List[str]] = None,
+    filters: Optional[dict] = None,
+    order_by: Optional[Union[str, List[str]]] = None,
+    with_count: bool = False,
+    as_: Optional[str] = None,
+) -> Union[List[DeclarativeMeta], Tuple[List[DeclarativeMeta], int]]:
+    columns = _row_columns(model, columns, eager, as_)
+    if as_ is not None:
+        statement = (
+            _row_statement(model, tuple(columns))
+            .where(*_filter_criteria(model, filters))
+            .order_by(*_ordering(model, order_by))
+            .offset(offset)
+            .limit(limit)
+        )
+        if not with_count:
+            return _shape_rows(db.execute(statement).all(), as_)
+
+        # the same single round-trip as below; the window column is dropped
+        # from the rows before they are shaped
+        frozen = db.execute(
+            statement.add_columns(sqlalchemy.func.count().over())
+        ).freeze()
+        counted = frozen().all()
+        rows = _shape_rows(frozen().columns(*range(len(columns))).all(), as_)
+        if counted:
+            return rows, counted[0][-1]
+        if offset:
+            return rows, count_models(db, model, filters)
+        return rows, 0
 
+    query = (
+        _query(db, model, columns, eager)
+        .filter(*_filter_criteria(model, filters))
+        .order_by(*_ordering(model, order_by))
+        .offset(offset)
+        .limit(limit)
+    )
+    if not with_count:
+        return query.all()
 
+    if columns:
+        # a window column would change the shape of the returned rows
+        return query.all(), count_models(db, model, filters)
+
+    # count(*) OVER () is evaluated before LIMIT/OFFSET, so every row of the
+    # page carries the total and the page and count share one round-trip
+    rows = query.add_columns(sqlalchemy.func.count().over()).all()
+    if rows:
+        return [db_model for db_model, _ in rows], rows[0][1]
+    if offset:
+        return [], count_models(db, model, filters)
+    return [], 0
+
+
+@_instrumented(rows=lambda result: 1)
+def count_models(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    filters: Optional[dict] = None,
+) -> int:
+    statement = (
+        sqlalchemy.select(sqlalchemy.func.count())
+        .select_from(model)
+        .where(*_filter_criteria(model, filters))
+    )
+    return db.execute(statement).scalar()
+
+
+@_instrumented(rows=lambda result: 1)
+def exists_model(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    filters: Optional[dict] = None,
+) -> bool:
+    statement = (
+        sqlalchemy.select(sqlalchemy.literal(1))
+        .select_from(model)
+        .where(*_filter_criteria(model, filters))
+    )
+    return db.execute(sqlalchemy.select(statement.exists())).scalar()
+
+
+@_instrumented()
+def get_models_page(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    after: Optional[str] = None,
+    limit: int = 100,
+    order_by: Optional[str] = None,
+    eager: Optional[List[str]] = None,
+    filters: Optional[dict] = None,
+) -> Tuple[List[DeclarativeMeta], Optional[str]]:
+    query = _query(db, model, eager=eager).filter(*_filter_criteria(model, filters))
+    return _keyset_page(query, model, after, limit, order_by)
+
+
+@_instrumented()
+def iter_models(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    attribute: Optional[str] = None,
+    attribute_value=None,
+    chunk_size: int = 1000,
+    filters: Optional[dict] = None,
+) -> Iterator[DeclarativeMeta]:
+    query = db.query(model).filter(*_filter_criteria(model, filters))
+    if attribute is not None:
+        model_attribute = _model_attribute(model, attribute)
+        query = query.filter(model_attribute == attribute_value)
+
+    if db.get_bind().dialect.supports_server_side_cursors:
+        db_models = _iter_server_side(query, model, chunk_size)
+    else:
+        db_models = _iter_keyset(query, model, chunk_size)
+
+    # each instance leaves the identity map once the caller moves on, so
+    # memory stays flat no matter how many rows the iteration covers
+    for db_model in db_models:
+        yield db_model
+        if db_model in db:
+            db.expunge(db_model)
+
+
+@_instrumented(rows=_one_row)
 def get_model(
-    db: Session, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], model_id: int
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    model_id: Union[int, tuple],
+    eager: Optional[List[str]] = None,
 ) -> Union[DeclarativeMeta, None]:
-    return get_model_by_attribute(
-        db=db, model=model, attribute="id", attribute_value=model_id
+    # Session.get resolves the mapper's real (possibly composite) primary key
+    # and answers from the identity map when the row is already loaded
+    if eager:
+        return db.get(model, model_id, options=_eager_options(model, eager))
+    if not _use_cache(db) or identity_key(model, model_id) in db.identity_map:
+        return db.get(model, model_id)
+
+    primary_key = ",".join(_registry.get(model).primary_key_keys)
+    return _cached_lookup(
+        db, model, primary_key, model_id, lambda: db.get(model, model_id)
     )
 
 
+@_instrumented()
+def get_models_by_ids(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    model_ids: Iterable,
+    chunk_size: int = 500,
+    as_dict: bool = False,
+) -> Union[List[Optional[DeclarativeMeta]], Dict[object, DeclarativeMeta]]:
+    model_ids = list(model_ids)
+    mapper = _registry.get(model).mapper
+    single_key = len(mapper.primary_key) == 1
+    found = {}
+
+    # rows this session already holds in an unexpired state cost nothing
+    missing = []
+    for model_id in dict.fromkeys(model_ids):
+        db_model = db.identity_map.get(identity_key(model, model_id))
+        if db_model is not None and not sqlalchemy.inspect(db_model).expired:
+            found[model_id] = db_model
+        else:
+            missing.append(model_id)
+
+    for chunk in _chunked(missing, chunk_size):
+        for db_model in db.query(model).filter(_primary_key_criterion(model, chunk)):
+            primary_key = tuple(mapper.primary_key_from_instance(db_model))
+            found[primary_key[0] if single_key else primary_key] = db_model
+
+    if as_dict:
+        return found
+    return [found.get(model_id) for model_id in model_ids]
+
+
+@_instrumented(rows=_one_row)
 def get_model_by_attribute(
     db: Session,
     model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
     attribute: str,
     attribute_value,
+    columns: Optional[List[str]] = None,
+    eager: Optional[List[str]] = None,
+    as_: Optional[str] = None,
 ) -> Union[DeclarativeMeta, None]:
-    if hasattr(model, attribute):
-        model_attribute = getattr(model, attribute)
-        return db.query(model).filter(model_attribute == attribute_value).first()
-    else:
-        raise AttributeError
+    columns = _row_columns(model, columns, eager, as_)
+    statement = _attribute_statement(
+        model, attribute, "first", tuple(columns or ()), tuple(eager or ())
+    )
+
+    def load():
+        result = db.execute(statement, {"attribute_value": attribute_value})
+        return result.first() if columns else result.scalars().first()
+
+    if columns:
+        row = load()
+        return row if row is None else _shape_rows([row], as_)[0]
+    if eager or not _use_cache(db) or attribute not in _registry.get(model).columns:
+        return load()
+    return _cached_lookup(db, model, attribute, attribute_value, load)
 
 
+@_instrumented()
 def get_models_by_attribute(
     db: Session,
     model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
     attribute: str,
     attribute_value,
     offset: int = 0,
-    limit: int = 100,
+    limit: Optional[int] = 100,
+    columns: Optional[List[str]] = None,
+    eager: Optional[List[str]] = None,
+    as_: Optional[str] = None,
 ) -> List[DeclarativeMeta]:
-    if hasattr(model, attribute):
-        model_attribute = getattr(model, attribute)
-        return (
-            db.query(model)
-            .filter(model_attribute == attribute_value)
-            .offset(offset)
-            .limit(limit)
-            .all()
-        )
-    else:
-        raise AttributeError
+    columns = _row_columns(model, columns, eager, as_)
+    # limit=None means no limit, as in get_models, not LIMIT NULL
+    statement = _attribute_statement(
+        model,
+        attribute,
+        "all" if limit is None else "page",
+        tuple(columns or ()),
+        tuple(eager or ()),
+    )
+    result = db.execute(
+        statement,
+        {"attribute_value": attribute_value, "offset": offset, "limit": limit},
+    )
+    return _shape_rows(result.all(), as_) if columns else result.scalars().all()
+
+
+@_instrumented()
+def get_models_by_attribute_page(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    attribute: str,
+    attribute_value,
+    after: Optional[str] = None,
+    limit: int = 100,
+    order_by: Optional[str] = None,
+    eager: Optional[List[str]] = None,
+) -> Tuple[List[DeclarativeMeta], Optional[str]]:
+    model_attribute = _model_attribute(model, attribute)
+    query = _query(db, model, eager=eager).filter(model_attribute == attribute_value)
+    return _keyset_page(query, model, after, limit, order_by)
 
 
+@_instrumented(rows=_one_row)
 def create_model(
-    db: Session, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], schema: dict
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    schema: dict,
+    refresh: bool = False,
 ) -> DeclarativeMeta:
     db_model = model(**schema)
     db.add(db_model)
-    db.commit()
-    db.refresh(db_model)
+    _commit_instance(db, db_model, model, refresh=refresh)
     return db_model
 
 
+@_instrumented()
+def create_models(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    schemas: Iterable[dict],
+    batch_size: int = 1000,
+    return_objects: bool = False,
+) -> Union[int, List[DeclarativeMeta]]:
+    table = model.__table__
+    created = 0
+    db_models = []
+
+    for batch in _chunked(schemas, batch_size):
+        rows = [_column_values(model, schema) for schema in batch]
+        if return_objects:
+            primary_keys = [None] * len(rows)
+            for indexes, group in _group_by_keys(rows):
+                keys = _insert_returning_primary_keys(db, table, group)
+                for index, primary_key in zip(indexes, keys):
+                    primary_keys[index] = primary_key
+            _commit(db, model)
+            db_models.extend(_get_models_by_primary_keys(db, model, primary_keys))
+        else:
+            for _, group in _group_by_keys(rows):
+                db.execute(table.insert(), group)
+            _commit(db, model)
+        created += len(rows)
+
+    return db_models if return_objects else created
+
+
+@_instrumented()
+def upsert_models(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    schemas: Iterable[dict],
+    conflict_on: List[str],
+    update_fields: Optional[List[str]] = None,
+    batch_size: int = 1000,
+) -> int:
+    table = model.__table__
+    conflict_columns = _columns(model, conflict_on)
+    upserted = 0
+
+    for batch in _chunked(schemas, batch_size):
+        rows = [_column_values(model, schema) for schema in batch]
+        for _, group in _group_by_keys(rows):
+            if update_fields is None:
+                update_columns = [
+                    table.c[key]
+                    for key in group[0]
+                    if table.c[key] not in conflict_columns
+                ]
+            else:
+                update_columns = _columns(model, update_fields)
+
+            statement = _upsert_statement(
+                db.get_bind().dialect.name, table, conflict_columns, update_columns
+            )
+            if statement is None:
+                _upsert_fallback(db, table, group, conflict_columns, update_columns)
+            else:
+                db.execute(statement, group)
+
+        _commit(db, model)
+        _expire_model(db, model)
+        upserted += len(rows)
+
+    return upserted
+
+
+@_instrumented(rows=_one_row)
 def update_model(
     db: Session,
     model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
     model_id: int,
     schema: dict,
-) -> Union[DeclarativeMeta, None]:
-    db_model = get_model(db=db, model=model, model_id=model_id)
-    for key, value in schema.items():
-        if hasattr(db_model, key):
-            setattr(db_model, key, value)
-        else:
-            raise AttributeError
+    refresh: bool = False,
+    with_changed: bool = False,
+    expected_version: Any = None,
+) -> Union[DeclarativeMeta, None, Tuple[Optional[DeclarativeMeta], bool]]:
+    if expected_version is not None:
+        db_model = _update_versioned(
+            db, model, model_id, schema, expected_version, refresh
+        )
+        return (db_model, True) if with_changed else db_model
 
-    db.commit()
-    db.refresh(db_model)
-    return db_model
+    db_model = get_model(db=db, model=model, model_id=model_id)
+    changed = _apply_schema(db, model, db_model, schema)
+    if changed or _has_changes(db):
+        _commit_versioned(db, db_model, model, refresh=refresh)
+    return (db_model, changed) if with_changed else db_model
 
 
+@_instrumented(rows=_one_row)
 def update_model_by_attribute(
     db: Session,
     model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
     lookup_attribute: str,
     lookup_attribute_value,
     schema: dict,
-) -> Union[DeclarativeMeta, None]:
+    refresh: bool = False,
+    with_changed: bool = False,
+    expected_version: Any = None,
+) -> Union[DeclarativeMeta, None, Tuple[Optional[DeclarativeMeta], bool]]:
     db_model = get_model_by_attribute(
         db=db,
         model=model,
         attribute=lookup_attribute,
         attribute_value=lookup_attribute_value,
     )
-    for key, value in schema.items():
-        if hasattr(db_model, key):
-            setattr(db_model, key, value)
-        else:
-            raise AttributeError
+    if expected_version is not None and db_model is not None:
+        # the lookup only resolves the primary key; the write itself is
+        # still one conditional UPDATE
+        model_id = sqlalchemy.inspect(db_model).identity
+        db_model = _update_versioned(
+            db,
+            model,
+            model_id[0] if len(model_id) == 1 else model_id,
+            schema,
+            expected_version,
+            refresh,
+        )
+        return (db_model, True) if with_changed else db_model
 
-    db.commit()
-    db.refresh(db_model)
-    return db_model
+    changed = _apply_schema(db, model, db_model, schema)
+    if changed or _has_changes(db):
+        _commit_versioned(db, db_model, model, refresh=refresh)
+    return (db_model, changed) if with_changed else db_model
+
+
+@_instrumented()
+def update_models(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    model_ids: Iterable,
+    schema: dict,
+    chunk_size: int = 500,
+) -> int:
+    _validate_attributes(model, schema)
+    schema = _bulk_version(_registry.get(model), schema)
+    updated = 0
+    for chunk in _chunked(model_ids, chunk_size):
+        updated += _update_where(
+            db, model, _primary_key_criterion(model, chunk), schema
+        )
+
+    _commit(db, model)
+    return updated
+
+
+@_instrumented()
+def update_models_by_attribute(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    attribute: str,
+    attribute_value,
+    schema: dict,
+) -> int:
+    _validate_attributes(model, schema)
+    schema = _bulk_version(_registry.get(model), schema)
+    model_attribute = _model_attribute(model, attribute)
+    updated = _update_where(db, model, model_attribute == attribute_value, schema)
 
+    _commit(db, model)
+    return updated
 
+
+@_instrumented(rows=lambda result: 1)
 def delete_model(
-    db: Session, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], model_id: int
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    model_id: int,
+    expected_version: Any = None,
 ) -> None:
+    if expected_version is not None:
+        criterion = _version_criterion(model, model_id, expected_version)
+        if not _delete_where(db, model, criterion):
+            raise _version_conflict(model, model_id, expected_version)
+
+        db_model = db.identity_map.get(identity_key(model, model_id))
+        if db_model is not None:
+            db.expunge(db_model)
+        _commit(db, model)
+        return
+
     db_model = get_model(db=db, model=model, model_id=model_id)
     db.delete(db_model)
-    db.commit()
+    try:
+        _commit(db, model)
+    except StaleDataError as exc:
+        raise VersionConflictError(str(exc)) from exc
 
 
+@_instrumented()
+def delete_models(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    model_ids: Iterable,
+    chunk_size: int = 500,
+) -> int:
+    deleted = 0
+    for chunk in _chunked(model_ids, chunk_size):
+        deleted += _delete_where(db, model, _primary_key_criterion(model, chunk))
+
+    _commit(db, model)
+    return deleted
+
+
+@_instrumented()
+def delete_models_by_attribute(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    attribute: str,
+    attribute_value,
+) -> int:
+    model_attribute = _model_attribute(model, attribute)
+    deleted = _delete_where(db, model, model_attribute == attribute_value)
+
+    _commit(db, model)
+    return deleted
+
+
+@_instrumented(rows=_one_row)
 def link_models(
     db: Session,
     parent_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
@@ -122,19 +755,18 @@ def link_models(
     child_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
     child_id: int,
     backref: str,
+    refresh: bool = False,
 ) -> Union[DeclarativeMeta, None]:
     parent = get_model(db=db, model=parent_model, model_id=parent_id)
     child = get_model(db=db, model=child_model, model_id=child_id)
 
-    if hasattr(parent, backref):
-        getattr(parent, backref).append(child)
-        db.commit()
-        db.refresh(parent)
-        return parent
-    else:
-        raise AttributeError
+    _registry.get(parent_model).relationship(backref)
+    getattr(parent, backref).append(child)
+    _commit_instance(db, parent, parent_model, child_model, refresh=refresh)
+    return parent
 
 
+@_instrumented(rows=_one_row)
 def unlink_models(
     db: Session,
     parent_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
@@ -142,14 +774,1097 @@ def unlink_models(
     child_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
     child_id: int,
     backref: str,
+    refresh: bool = False,
 ) -> Union[DeclarativeMeta, None]:
     parent = get_model(db=db, model=parent_model, model_id=parent_id)
     child = get_model(db=db, model=child_model, model_id=child_id)
 
-    if hasattr(parent, backref):
-        getattr(parent, backref).remove(child)
-        db.commit()
-        db.refresh(parent)
-        return parent
+    _registry.get(parent_model).relationship(backref)
+    getattr(parent, backref).remove(child)
+    _commit_instance(db, parent, parent_model, child_model, refresh=refresh)
+    return parent
+
+
+@_instrumented()
+def link_many(
+    db: Session,
+    parent_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    parent_id: int,
+    child_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    child_ids: Iterable,
+    backref: str,
+    chunk_size: int = 500,
+) -> int:
+    relationship = _secondary_relationship(parent_model, child_model, backref)
+    parent_column, child_column = _secondary_columns(relationship)
+    ((parent_key, _),) = relationship.synchronize_pairs
+    ((child_key, _),) = relationship.secondary_synchronize_pairs
+    child_ids = list(dict.fromkeys(child_ids))
+
+    # like link_models, ids that do not exist are an error rather than
+    # orphaned association rows, which nothing enforces without foreign keys
+    parent = db.execute(
+        sqlalchemy.select(parent_key).where(parent_key == parent_id)
+    ).first()
+    if parent is None:
+        raise AttributeError(f"{parent_model.__name__} {parent_id!r} does not exist")
+
+    rows = []
+    for chunk in _chunked(child_ids, chunk_size):
+        # one query per chunk says which children exist and which of them
+        # are already linked; the parent's collection is never read
+        linked_children = dict(
+            db.execute(
+                sqlalchemy.select(child_key, child_column)
+                .select_from(
+                    child_key.table.outerjoin(
+                        relationship.secondary,
+                        sqlalchemy.and_(
+                            child_column == child_key, parent_column == parent_id
+                        ),
+                    )
+                )
+                .where(child_key.in_(chunk))
+            ).all()
+        )
+        missing = [child_id for child_id in chunk if child_id not in linked_children]
+        if missing:
+            raise AttributeError(f"{child_model.__name__} {missing!r} do not exist")
+        rows.extend(
+            {parent_column.key: parent_id, child_column.key: child_id}
+            for child_id in chunk
+            if linked_children[child_id] is None
+        )
+
+    # nothing is written until every chunk has been checked
+    for chunk in _chunked(rows, chunk_size):
+        db.execute(relationship.secondary.insert(), chunk)
+    linked = len(rows)
+
+    _expire_linked(db, relationship, parent_model, parent_id, child_model, child_ids)
+    _commit(db, parent_model, child_model)
+    return linked
+
+
+@_instrumented()
+def unlink_many(
+    db: Session,
+    parent_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    parent_id: int,
+    child_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    child_ids: Iterable,
+    backref: str,
+    chunk_size: int = 500,
+) -> int:
+    relationship = _secondary_relationship(parent_model, child_model, backref)
+    parent_column, child_column = _secondary_columns(relationship)
+    child_ids = list(dict.fromkeys(child_ids))
+
+    unlinked = 0
+    for chunk in _chunked(child_ids, chunk_size):
+        result = db.execute(
+            relationship.secondary.delete().where(
+                parent_column == parent_id, child_column.in_(chunk)
+            )
+        )
+        unlinked += result.rowcount
+
+    _expire_linked(db, relationship, parent_model, parent_id, child_model, child_ids)
+    _commit(db, parent_model, child_model)
+    return unlinked
+
+
+def _enter_unit_of_work(db: Session) -> int:
+    depth = db.info.get(_UNIT_OF_WORK, 0)
+    if depth > 0:
+        db.info.setdefault(_SAVEPOINTS, []).append(db.begin_nested())
+    db.info[_UNIT_OF_WORK] = depth + 1
+    return depth
+
+
+def _exit_unit_of_work(db: Session, depth: int, failed: bool) -> None:
+    db.info[_UNIT_OF_WORK] = depth
+    if depth > 0:
+        savepoint = db.info[_SAVEPOINTS].pop()
+        if failed:
+            savepoint.rollback()
+        else:
+            savepoint.commit()
+        return
+
+    pending_invalidations = db.info.pop(_PENDING_INVALIDATIONS, ())
+    if failed:
+        db.rollback()
     else:
-        raise AttributeError
+        _commit(db, *pending_invalidations)
+
+
+def _in_unit_of_work(db: Session) -> bool:
+    return db.info.get(_UNIT_OF_WORK, 0) > 0
+
+
+def _commit(
+    db: Session, *models: Type[sqlalchemy.orm.decl_api.DeclarativeMeta]
+) -> None:
+    if _in_unit_of_work(db):
+        db.flush()
+        db.info.setdefault(_PENDING_INVALIDATIONS, set()).update(models)
+        return
+
+    db.commit()
+    for model in models:
+        _invalidate_cache(model)
+
+    call = _current_call.get()
+    if call is not None:
+        call.commits += 1
+
+
+def _apply_schema(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    db_model: Optional[DeclarativeMeta],
+    schema: dict,
+) -> bool:
+    attributes = _registry.get(model).attributes
+    for key, value in schema.items():
+        if db_model is None or key not in attributes:
+            raise AttributeError(key)
+        setattr(db_model, key, value)
+
+    # assigning the value already stored leaves no net history, so this is
+    # only true for real changes, and the flush only updates those columns
+    return db.is_modified(db_model)
+
+
+def _has_changes(db: Session) -> bool:
+    # other pending work in the session still gets the commit crud promises
+    return bool(db.new or db.deleted or any(db.is_modified(obj) for obj in db.dirty))
+
+
+def _commit_versioned(
+    db: Session,
+    db_model: DeclarativeMeta,
+    *models: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    refresh: bool,
+) -> None:
+    # with a mapper version_id_col the flush already updates WHERE the
+    # loaded version still matches; a miss surfaces as a version conflict
+    try:
+        _commit_instance(db, db_model, *models, refresh=refresh)
+    except StaleDataError as exc:
+        raise VersionConflictError(str(exc)) from exc
+
+
+def _update_versioned(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    model_id,
+    schema: dict,
+    expected_version,
+    refresh: bool,
+) -> DeclarativeMeta:
+    # a single UPDATE ... WHERE <primary key> AND <version> = expected, so no
+    # read and no row lock is needed to detect a concurrent write
+    _validate_attributes(model, schema)
+    info = _registry.get(model)
+    version = _version_column(model)
+    values = dict(schema)
+    version_key = info.version_key
+    if version_key not in values:
+        next_version = _next_version(info, version, expected_version)
+        if next_version is not None:
+            values[version_key] = next_version
+
+    criterion = _version_criterion(model, model_id, expected_version)
+    if not _update_where(db, model, criterion, values):
+        raise _version_conflict(model, model_id, expected_version)
+    _commit(db, model)
+
+    # the written values are known, so the session's instance is brought up
+    # to date without reading the row back; columns the database set on
+    # update are left expired and load on access
+    model_ids = model_id if isinstance(model_id, tuple) else (model_id,)
+    primary_key = dict(zip(info.primary_key_keys, model_ids))
+    db_model = _merge_cached(db, model, {**primary_key, **values})
+    for key, value in values.items():
+        set_committed_value(db_model, key, value)
+    expired = [key for key in info.updated_by_database if key not in values]
+    if expired:
+        db.expire(db_model, expired)
+
+    if refresh and not _in_unit_of_work(db):
+        _refresh(db, db_model)
+    return db_model
+
+
+def _version_column(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+) -> sqlalchemy.Column:
+    version = _registry.get(model).version
+    if version is None:
+        raise ValueError(
+            f"{model.__name__} has no version_id_col; "
+            "configure one with set_version_column"
+        )
+    return version
+
+
+def _next_version(info: ModelInfo, version: sqlalchemy.Column, expected_version):
+    if version is info.mapper.version_id_col:
+        # version_id_generator=False means the database maintains it
+        generator = info.mapper.version_id_generator
+        return None if generator is False else generator(expected_version)
+    return expected_version + 1
+
+
+def _bulk_version(info: ModelInfo, schema: dict) -> dict:
+    # bulk updates bump the version of every row they touch, so a later
+    # update_model(expected_version=...) cannot overwrite them unnoticed
+    version = info.version
+    if version is None or info.version_key in schema:
+        return schema
+    if version is info.mapper.version_id_col:
+        generator = info.mapper.version_id_generator
+        if generator is False:
+            return schema
+        if not isinstance(version.type, sqlalchemy.Integer):
+            # a custom generator cannot run per row inside one UPDATE; any
+            # fresh value still differs from what each row held before
+            return {**schema, info.version_key: generator(None)}
+    return {**schema, info.version_key: sqlalchemy.func.coalesce(version, 0) + 1}
+
+
+def _version_criterion(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], model_id, expected_version
+):
+    return sqlalchemy.and_(
+        _primary_key_criterion(model, [model_id]),
+        _version_column(model) == expected_version,
+    )
+
+
+def _version_conflict(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], model_id, expected_version
+) -> VersionConflictError:
+    return VersionConflictError(
+        f"{model.__name__} {model_id!r} is no longer at version "
+        f"{expected_version!r}; it was changed or deleted concurrently"
+    )
+
+
+def _commit_instance(
+    db: Session,
+    db_model: DeclarativeMeta,
+    *models: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    refresh: bool,
+) -> None:
+    # inside a unit of work the instance is only flushed, so its state is
+    # still current; server-generated values load lazily on first access
+    if _in_unit_of_work(db):
+        _commit(db, *models)
+        return
+
+    # commit expires every instance, but the values this session just flushed
+    # are still the committed ones, so they are put back instead of being
+    # selected again; a mapper with eager_defaults also gets its server
+    # generated values back from the flush, via RETURNING where supported
+    db.flush()
+    state = sqlalchemy.inspect(db_model)
+    loaded = {}
+    if db.expire_on_commit:
+        loaded = {
+            key: state.dict[key]
+            for key in state.mapper.attrs.keys()
+            if key in state.dict
+        }
+
+    _commit(db, *models)
+    for key, value in loaded.items():
+        set_committed_value(db_model, key, value)
+
+    if refresh:
+        _refresh(db, db_model)
+
+
+def _refresh(db: Session, db_model: DeclarativeMeta) -> None:
+    # only columns the database generated and the flush did not return are
+    # still unloaded; everything else is already current
+    state = sqlalchemy.inspect(db_model)
+    not_loaded = state.unloaded
+    unloaded = [
+        key for key in _registry.get(state.class_).refreshable if key in not_loaded
+    ]
+    if not unloaded:
+        return
+
+    db.refresh(db_model, attribute_names=unloaded)
+
+    call = _current_call.get()
+    if call is not None:
+        call.refreshes += 1
+
+
+def _use_cache(db: Session) -> bool:
+    # reads inside a unit of work may see uncommitted rows, so they neither
+    # populate nor trust the shared cache
+    return _cache is not None and not _in_unit_of_work(db)
+
+
+def _cache_key(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], attribute: str, value
+) -> str:
+    table = _registry.get(model).table_name
+    # entries are namespaced by a per-table generation token kept in the
+    # backend itself, so every process sharing the backend sees invalidations
+    generation_key = f"sqlalchemy_crud:{table}:generation"
+    generation = _cache.get(generation_key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        _cache.set(generation_key, generation)
+    return f"sqlalchemy_crud:{table}:{generation}:{attribute}:{value!r}"
+
+
+def _invalidate_cache(model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta]) -> None:
+    if _cache is not None:
+        table = _registry.get(model).table_name
+        _cache.set(f"sqlalchemy_crud:{table}:generation", uuid.uuid4().hex)
+
+
+def _install_flush_listeners() -> None:
+    # class-level session events, so every session records whether its
+    # current transaction has written anything the cache must not see
+    if not sqlalchemy.event.contains(Session, "after_flush", _on_flush):
+        sqlalchemy.event.listen(Session, "after_flush", _on_flush)
+        sqlalchemy.event.listen(Session, "after_transaction_end", _on_transaction_end)
+
+
+def _on_flush(db: Session, flush_context) -> None:
+    db.info[_FLUSHED] = True
+
+
+def _on_transaction_end(db: Session, transaction) -> None:
+    if transaction.parent is None:
+        db.info.pop(_FLUSHED, None)
+
+
+def _cacheable(db: Session) -> bool:
+    # a row read while this session holds changes, flushed or not, may show
+    # values that are never committed, so it must not reach the shared cache
+    return not (db.new or db.dirty or db.deleted or db.info.get(_FLUSHED))
+
+
+def _cached_lookup(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    attribute: str,
+    attribute_value,
+    load,
+) -> Union[DeclarativeMeta, None]:
+    key = _cache_key(model, attribute, attribute_value)
+    values = _cache.get(key)
+
+    if values is not None:
+        _cache.hits += 1
+        return _merge_cached(db, model, values)
+
+    _cache.misses += 1
+    db_model = load()
+    if db_model is not None and _cacheable(db):
+        loaded = sqlalchemy.inspect(db_model).dict
+        _cache.set(
+            key,
+            {
+                name: loaded[name]
+                for name in _registry.get(model).columns
+                if name in loaded
+            },
+        )
+    return db_model
+
+
+def _merge_cached(
+    db: Session, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], values: dict
+) -> DeclarativeMeta:
+    # build a clean persistent instance without running the model's __init__;
+    # anything that was not cached is left expired and loads on access
+    db_model = _registry.get(model).mapper.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(db_model, key, value)
+    make_transient_to_detached(db_model)
+
+    existing = db.identity_map.get(sqlalchemy.inspect(db_model).key)
+    if existing is not None:
+        return existing
+
+    db.add(db_model)
+    return db_model
+
+
+def _chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    if size < 1:
+        raise ValueError("size must be a positive integer")
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _group_by_keys(rows: List[dict]) -> List[Tuple[List[int], List[dict]]]:
+    # an executemany takes its column list from the first row, so rows that
+    # set different columns go out as separate statements; missing keys are
+    # not filled with None, which would override the column defaults
+    groups: Dict[frozenset, Tuple[List[int], List[dict]]] = {}
+    for index, row in enumerate(rows):
+        indexes, group = groups.setdefault(frozenset(row), ([], []))
+        indexes.append(index)
+        group.append(row)
+    return list(groups.values())
+
+
+def _column_values(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], schema: dict
+) -> dict:
+    columns = _registry.get(model).columns
+    values = {}
+    for key, value in schema.items():
+        if key not in columns:
+            # mirror the TypeError raised by the declarative constructor
+            raise TypeError(
+                f"{key!r} is an invalid keyword argument for {model.__name__}"
+            )
+        values[columns[key].key] = value
+    return values
+
+
+def _validate_attributes(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], schema: dict
+) -> None:
+    columns = _registry.get(model).columns
+    for key in schema:
+        if key not in columns:
+            raise AttributeError(key)
+
+
+def _model_attribute(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], attribute: str
+):
+    info = _registry.get(model)
+    column = info.columns.get(attribute)
+    if column is not None:
+        return column
+    # hybrids and other instrumented attributes resolve to their expression
+    if attribute in info.attributes:
+        return getattr(model, attribute)
+    raise AttributeError(attribute)
+
+
+def _query(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    columns: Optional[List[str]] = None,
+    eager: Optional[List[str]] = None,
+) -> sqlalchemy.orm.Query:
+    if columns:
+        if eager:
+            raise ValueError("columns and eager cannot be combined")
+        # plain column queries return lightweight rows that never enter the
+        # identity map
+        _columns(model, columns)
+        return db.query(*(getattr(model, column) for column in columns))
+
+    query = db.query(model)
+    if eager:
+        query = query.options(*_eager_options(model, eager))
+    return query
+
+
+_ROW_SHAPES = {
+    # Row already behaves like a named tuple, so it is returned as is
+    "namedtuple": None,
+    "tuple": tuple,
+    "dict": lambda row: dict(row._mapping),
+}
+
+
+def _row_columns(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    columns: Optional[List[str]],
+    eager: Optional[List[str]],
+    as_: Optional[str],
+) -> Optional[List[str]]:
+    # row mode selects plain columns, all of them unless narrowed, so no
+    # instance, instance state or identity map entry is ever created
+    if as_ is None:
+        return columns
+    if as_ not in _ROW_SHAPES:
+        raise ValueError(f"as_ must be one of {', '.join(_ROW_SHAPES)}")
+    if eager:
+        raise ValueError("as_ and eager cannot be combined")
+    return columns or list(_registry.get(model).columns)
+
+
+def _row_statement(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], columns: tuple
+) -> sqlalchemy.sql.Select:
+    # plain table columns keep the statement out of the ORM compile and
+    # loading path; labels keep the attribute names as the row keys
+    return sqlalchemy.select(
+        *(
+            column.label(key)
+            for key, column in zip(columns, _columns(model, list(columns)))
+        )
+    )
+
+
+def _shape_rows(rows: list, as_: Optional[str]) -> list:
+    shape = _ROW_SHAPES.get(as_)
+    if shape is None:
+        return rows
+    return [shape(row) for row in rows]
+
+
+@functools.lru_cache(maxsize=512)
+def _attribute_statement(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    attribute: str,
+    operation: str,
+    columns: tuple,
+    eager: tuple,
+) -> sqlalchemy.sql.Select:
+    # built and validated once per shape; every call only binds new values,
+    # and the stable statement also hits SQLAlchemy's compiled cache
+    model_attribute = _model_attribute(model, attribute)
+    if columns:
+        if eager:
+            raise ValueError("columns and eager cannot be combined")
+        statement = _row_statement(model, columns)
+    else:
+        statement = sqlalchemy.select(model)
+        if eager:
+            statement = statement.options(*_eager_options(model, list(eager)))
+
+    statement = statement.where(
+        model_attribute == sqlalchemy.bindparam("attribute_value")
+    )
+    if operation == "first":
+        return statement.limit(1)
+    statement = statement.order_by(*_primary_key(model)).offset(
+        sqlalchemy.bindparam("offset")
+    )
+    if operation == "all":
+        return statement
+    return statement.limit(sqlalchemy.bindparam("limit"))
+
+
+_FILTER_OPERATORS = {
+    "eq": lambda column, value: column == value,
+    "ne": lambda column, value: column != value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "in": lambda column, value: column.in_(value),
+    "notin": lambda column, value: column.not_in(value),
+    "like": lambda column, value: column.like(value),
+    "ilike": lambda column, value: column.ilike(value),
+    "isnull": lambda column, value: column.is_(None) if value else column.is_not(None),
+}
+
+
+def _filter_criteria(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], filters: Optional[dict]
+) -> list:
+    if not filters:
+        return []
+    return [_filter_operator(model, key)(value) for key, value in filters.items()]
+
+
+@functools.lru_cache(maxsize=512)
+def _filter_operator(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], key: str
+) -> Callable:
+    # "created__gte" -> created >= value; a bare column name means equality.
+    # Resolved and validated against the mapper once per (model, key).
+    attribute, _, operator = key.rpartition("__")
+    if not attribute or operator not in _FILTER_OPERATORS:
+        attribute, operator = key, "eq"
+
+    (column,) = _columns(model, [attribute])
+    return functools.partial(_FILTER_OPERATORS[operator], column)
+
+
+def _ordering(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    order_by: Optional[Union[str, List[str]]],
+) -> list:
+    if isinstance(order_by, str):
+        order_by = [order_by]
+
+    ordering, ordered = [], set()
+    for key in order_by or ():
+        attribute = key.lstrip("-")
+        (column,) = _columns(model, [attribute])
+        ordering.append(column.desc() if key.startswith("-") else column)
+        ordered.add(column)
+
+    # the primary key always breaks ties so pages are stable between calls
+    ordering.extend(column for column in _primary_key(model) if column not in ordered)
+    return ordering
+
+
+def _eager_options(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], eager: List[str]
+) -> list:
+    options = []
+    for path in eager:
+        # "children.parents" chains a loader for each hop of the path
+        option, current = None, model
+        for name in path.split("."):
+            relationship = _registry.get(current).relationship(name)
+            attribute = relationship.class_attribute
+            if option is None:
+                option = sqlalchemy.orm.selectinload(attribute)
+            else:
+                option = option.selectinload(attribute)
+            current = relationship.mapper.class_
+        options.append(option)
+    return options
+
+
+def _primary_key(model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta]) -> tuple:
+    return _registry.get(model).primary_key
+
+
+def _primary_key_criterion(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], model_ids: list
+):
+    primary_key = _registry.get(model).primary_key
+    if len(primary_key) == 1:
+        return primary_key[0].in_(model_ids)
+    return sqlalchemy.tuple_(*primary_key).in_(model_ids)
+
+
+def _update_where(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    criterion,
+    schema: dict,
+) -> int:
+    return (
+        db.query(model)
+        .filter(criterion)
+        .update(schema, synchronize_session=_synchronize_session(db))
+    )
+
+
+def _delete_where(
+    db: Session, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], criterion
+) -> int:
+    # the ORM removes many-to-many association rows when it deletes an
+    # instance; do the same for the bulk path so no dangling rows remain
+    for secondary, local_column, secondary_column in _registry.get(model).secondaries:
+        db.execute(
+            secondary.delete().where(
+                secondary_column.in_(sqlalchemy.select(local_column).where(criterion))
+            )
+        )
+
+    return (
+        db.query(model)
+        .filter(criterion)
+        .delete(synchronize_session=_synchronize_session(db))
+    )
+
+
+def _synchronize_session(db: Session) -> Union[str, bool]:
+    # outside a unit of work the commit that follows every bulk write expires
+    # the identity map; inside one nothing does, so the instances the
+    # statement matched are updated or removed in the session as well
+    return "fetch" if _in_unit_of_work(db) else False
+
+
+def _expire_model(
+    db: Session, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta]
+) -> None:
+    # Core writes cannot say which rows they touched, so inside a unit of
+    # work every loaded instance of the model reloads on next access
+    if _in_unit_of_work(db):
+        for db_model in list(db.identity_map.values()):
+            if isinstance(db_model, model):
+                db.expire(db_model)
+
+
+def _secondary_relationship(
+    parent_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    child_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    backref: str,
+) -> sqlalchemy.orm.RelationshipProperty:
+    relationship = _registry.get(parent_model).relationship(backref)
+    if relationship.secondary is None or relationship.mapper.class_ is not child_model:
+        raise ValueError(
+            f"{parent_model.__name__}.{backref} is not a many-to-many "
+            f"relationship to {child_model.__name__}"
+        )
+    return relationship
+
+
+def _secondary_columns(relationship: sqlalchemy.orm.RelationshipProperty) -> tuple:
+    # the ids passed in are primary keys, so each side of the association
+    # table must reference a single-column primary key
+    (parent_key, parent_column), *parent_rest = relationship.synchronize_pairs
+    (child_key, child_column), *child_rest = relationship.secondary_synchronize_pairs
+    if (
+        parent_rest
+        or child_rest
+        or not parent_key.primary_key
+        or not child_key.primary_key
+    ):
+        raise ValueError(f"{relationship} does not join on single-column primary keys")
+    return parent_column, child_column
+
+
+def _expire_linked(
+    db: Session,
+    relationship: sqlalchemy.orm.RelationshipProperty,
+    parent_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    parent_id: int,
+    child_model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    child_ids: Iterable,
+) -> None:
+    # collections already loaded in this session no longer match the
+    # association table; expire them so they reload on next access
+    parent = db.identity_map.get(identity_key(parent_model, parent_id))
+    if parent is not None:
+        db.expire(parent, [relationship.key])
+
+    for reverse in relationship._reverse_property:
+        for child_id in child_ids:
+            child = db.identity_map.get(identity_key(child_model, child_id))
+            if child is not None:
+                db.expire(child, [reverse.key])
+
+
+def _columns(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], attributes: List[str]
+) -> List[sqlalchemy.Column]:
+    info = _registry.get(model)
+    return [info.column(attribute) for attribute in attributes]
+
+
+def _key_criterion(columns: List[sqlalchemy.Column], keys: List[tuple]):
+    if len(columns) == 1:
+        return columns[0].in_([key[0] for key in keys])
+    # spelled out rather than as a row-value IN, which not every backend has
+    return sqlalchemy.or_(
+        *(
+            sqlalchemy.and_(*(column == value for column, value in zip(columns, key)))
+            for key in keys
+        )
+    )
+
+
+def _upsert_statement(
+    dialect_name: str,
+    table: sqlalchemy.Table,
+    conflict_columns: List[sqlalchemy.Column],
+    update_columns: List[sqlalchemy.Column],
+):
+    if dialect_name in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+        statement = insert(table)
+        if not update_columns:
+            return statement.on_conflict_do_nothing(index_elements=conflict_columns)
+        return statement.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_=_upsert_set(table, statement.excluded, update_columns),
+        )
+
+    if dialect_name in ("mysql", "mariadb"):
+        # MySQL resolves the conflict against whichever unique key is hit
+        statement = mysql.insert(table)
+        if not update_columns:
+            # a key assigned to itself leaves the row as it is; INSERT IGNORE
+            # would also turn truncation and NOT NULL errors into warnings
+            column = next(iter(table.primary_key.columns), conflict_columns[0])
+            return statement.on_duplicate_key_update({column.name: column})
+        return statement.on_duplicate_key_update(
+            _upsert_set(table, statement.inserted, update_columns)
+        )
+
+    return None
+
+
+def _upsert_set(
+    table: sqlalchemy.Table, inserted, update_columns: List[sqlalchemy.Column]
+) -> dict:
+    values = {column.key: inserted[column.key] for column in update_columns}
+    # the conflict branch is an UPDATE, so honour SQL-side onupdate defaults
+    # such as updated=func.now() the way an ORM flush would
+    for column in table.columns:
+        onupdate = column.onupdate
+        if (
+            column.key not in values
+            and onupdate is not None
+            and getattr(onupdate, "is_clause_element", False)
+        ):
+            values[column.key] = onupdate.arg
+    return values
+
+
+def _upsert_fallback(
+    db: Session,
+    table: sqlalchemy.Table,
+    rows: List[dict],
+    conflict_columns: List[sqlalchemy.Column],
+    update_columns: List[sqlalchemy.Column],
+) -> None:
+    # later rows win when the same key appears twice, as with ON CONFLICT
+    rows_by_key = {
+        tuple(row[column.key] for column in conflict_columns): row for row in rows
+    }
+    existing = {
+        tuple(row)
+        for row in db.execute(
+            sqlalchemy.select(*conflict_columns).where(
+                _key_criterion(conflict_columns, list(rows_by_key))
+            )
+        )
+    }
+
+    inserts = [row for key, row in rows_by_key.items() if key not in existing]
+    if inserts:
+        db.execute(table.insert(), inserts)
+
+    updates = [row for key, row in rows_by_key.items() if key in existing]
+    if updates and update_columns:
+        statement = (
+            table.update()
+            .where(
+                sqlalchemy.and_(
+                    *(
+                        column == sqlalchemy.bindparam(f"_key_{column.key}")
+                        for column in conflict_columns
+                    )
+                )
+            )
+            .values(
+                {
+                    column.key: sqlalchemy.bindparam(f"_value_{column.key}")
+                    for column in update_columns
+                }
+            )
+        )
+        db.execute(
+            statement,
+            [
+                {
+                    **{f"_key_{c.key}": row[c.key] for c in conflict_columns},
+                    **{f"_value_{c.key}": row[c.key] for c in update_columns},
+                }
+                for row in updates
+            ],
+        )
+
+
+def _insert_returning_primary_keys(
+    db: Session, table: sqlalchemy.Table, rows: List[dict]
+) -> List[tuple]:
+    primary_key = list(table.primary_key.columns)
+
+    if getattr(db.get_bind().dialect, "full_returning", False):
+        result = db.execute(table.insert().values(rows).returning(*primary_key))
+        return [tuple(row) for row in result]
+
+    # no multi-row RETURNING (e.g. SQLite): insert row by row inside the
+    # batch's transaction and collect the generated keys from the cursor
+    return [tuple(db.execute(table.insert(), row).inserted_primary_key) for row in rows]
+
+
+def _get_models_by_primary_keys(
+    db: Session,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    primary_keys: List[tuple],
+) -> List[DeclarativeMeta]:
+    if not primary_keys:
+        return []
+
+    mapper = _registry.get(model).mapper
+    if len(mapper.primary_key) == 1:
+        criterion = _primary_key_criterion(model, [key[0] for key in primary_keys])
+    else:
+        criterion = _primary_key_criterion(model, primary_keys)
+
+    db_models = {
+        tuple(mapper.primary_key_from_instance(db_model)): db_model
+        for db_model in db.query(model).filter(criterion)
+    }
+    return [db_models[key] for key in primary_keys]
+
+
+def _keyset_columns(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], order_by: Optional[str]
+) -> Tuple[list, bool]:
+    info = _registry.get(model)
+    descending = bool(order_by) and order_by.startswith("-")
+    # the primary key is appended as a tie-breaker so the ordering is total
+    # and every row has exactly one position in the sequence
+    columns = list(info.primary_key)
+
+    if order_by:
+        column = info.column(order_by.lstrip("-"))
+        if column not in columns:
+            columns.insert(0, column)
+
+    return columns, descending
+
+
+def _keyset_page(
+    query: sqlalchemy.orm.Query,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    after: Optional[str],
+    limit: int,
+    order_by: Optional[str],
+) -> Tuple[List[DeclarativeMeta], Optional[str]]:
+    columns, descending = _keyset_columns(model, order_by)
+
+    if after is not None:
+        query = query.filter(
+            _keyset_criterion(model, columns, _decode_cursor(after), descending)
+        )
+
+    ordering = [column.desc() if descending else column for column in columns]
+    # one extra row tells us whether another page exists without a second query
+    db_models = query.order_by(*ordering).limit(limit + 1).all()
+
+    if len(db_models) <= limit:
+        return db_models, None
+
+    db_models = db_models[:limit]
+    return db_models, _encode_cursor(_keyset_key(model, db_models[-1]))
+
+
+def _keyset_key(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], db_model: DeclarativeMeta
+) -> list:
+    # the cursor holds only the primary key of the last row; the ordering
+    # values are read back from the table by _keyset_criterion
+    state = sqlalchemy.inspect(db_model)
+    return [state.attrs[key].value for key in _registry.get(model).primary_key_keys]
+
+
+def _iter_server_side(
+    query: sqlalchemy.orm.Query,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    chunk_size: int,
+) -> Iterator[DeclarativeMeta]:
+    return iter(
+        query.order_by(*_primary_key(model))
+        .execution_options(stream_results=True)
+        .yield_per(chunk_size)
+    )
+
+
+def _iter_keyset(
+    query: sqlalchemy.orm.Query,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    chunk_size: int,
+) -> Iterator[DeclarativeMeta]:
+    columns, _ = _keyset_columns(model, None)
+    key = None
+
+    while True:
+        chunk_query = query
+        if key is not None:
+            chunk_query = query.filter(_keyset_criterion(model, columns, key, False))
+        db_models = chunk_query.order_by(*columns).limit(chunk_size).all()
+        if not db_models:
+            return
+
+        # read the seek key before the caller gets a chance to detach the row
+        key = _keyset_key(model, db_models[-1])
+        yield from db_models
+
+        if len(db_models) < chunk_size:
+            return
+
+
+def _keyset_criterion(
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    columns: list,
+    key: list,
+    descending: bool,
+):
+    primary_key = _registry.get(model).primary_key
+    if len(key) != len(primary_key):
+        raise ValueError("cursor does not match the requested ordering")
+
+    # ordering columns are compared with the values stored in the last row
+    # rather than with Python values bound again, which the database may not
+    # consider equal (SQLite keeps server-side timestamps without the
+    # fraction a bound datetime carries)
+    last_row = sqlalchemy.and_(
+        *(column == value for column, value in zip(primary_key, key))
+    )
+    values = []
+    for column in columns:
+        if column in primary_key:
+            values.append(key[primary_key.index(column)])
+        else:
+            stored = sqlalchemy.select(column).where(last_row).correlate(None)
+            values.append(stored.scalar_subquery())
+
+    # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y), which every
+    # backend can answer from a composite index
+    clauses = []
+    for position, column in enumerate(columns):
+        equal = [
+            previous == value
+            for previous, value in zip(columns[:position], values[:position])
+        ]
+        if descending:
+            beyond = column < values[position]
+        else:
+            beyond = column > values[position]
+        clauses.append(sqlalchemy.and_(*equal, beyond))
+    return sqlalchemy.or_(*clauses)
+
+
+_CURSOR_TYPES = {
+    "datetime": (datetime.datetime, datetime.datetime.fromisoformat),
+    "date": (datetime.date, datetime.date.fromisoformat),
+    "decimal": (decimal.Decimal, decimal.Decimal),
+    "uuid": (uuid.UUID, uuid.UUID),
+}
+
+
+def _encode_cursor(values: list) -> str:
+    def default(value):
+        for tag, (python_type, _) in _CURSOR_TYPES.items():
+            if isinstance(value, python_type):
+                text = value.isoformat() if tag in ("datetime", "date") else str(value)
+                return {"$": tag, "v": text}
+        raise TypeError(f"cannot encode {type(value).__name__} in a cursor")
+
+    payload = json.dumps(values, default=default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> list:
+    def object_hook(value):
+        if value.keys() == {"$", "v"} and value["$"] in _CURSOR_TYPES:
+            return _CURSOR_TYPES[value["$"]][1](value["v"])
+        return value
+
+    try:
+        payload = base64.urlsafe_b64decode(cursor.encode())
+        values = json.loads(payload, object_hook=object_hook)
+    except (ValueError, TypeError) as error:
+        raise ValueError("invalid cursor") from error
+
+    if not isinstance(values, list):
+        raise ValueError("invalid cursor")
+    return values
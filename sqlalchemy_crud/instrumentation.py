@@ -0,0 +1,158 @@
+import re
+import threading
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+
+class CallRecord:
+    """
+    What a single crud call cost, passed to every listener once it returns.
+
+    statements counts the SQL statements sent to the database, rows the rows
+    the call returned (or, for bulk writes, affected), and commits/refreshes
+    the session round-trips made on the caller's behalf. Crud functions that
+    call each other internally are reported once, as the outermost call.
+    """
+
+    __slots__ = (
+        "function",
+        "model",
+        "elapsed",
+        "statements",
+        "rows",
+        "commits",
+        "refreshes",
+        "error",
+    )
+
+    def __init__(self, function: str, model=None):
+        self.function = function
+        self.model = model
+        self.elapsed = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.commits = 0
+        self.refreshes = 0
+        self.error: Optional[BaseException] = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"CallRecord({fields})"
+
+
+class StatsCollector:
+    """
+    Listener that aggregates call records per crud function in memory.
+
+    Totals cover every call seen since the last reset; latency percentiles are
+    computed over the most recent `window` calls of each function.
+    """
+
+    def __init__(self, window: int = 10000):
+        if window < 1:
+            raise ValueError("window must be a positive integer")
+
+        self.window = window
+        self._functions: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record: CallRecord) -> None:
+        with self._lock:
+            totals = self._functions.get(record.function)
+            if totals is None:
+                totals = self._functions[record.function] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "statements": 0,
+                    "rows": 0,
+                    "commits": 0,
+                    "refreshes": 0,
+                    "elapsed": deque(maxlen=self.window),
+                }
+
+            totals["calls"] += 1
+            totals["errors"] += record.error is not None
+            totals["statements"] += record.statements
+            totals["rows"] += record.rows
+            totals["commits"] += record.commits
+            totals["refreshes"] += record.refreshes
+            totals["elapsed"].append(record.elapsed)
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            functions = {
+                function: dict(totals, elapsed=sorted(totals["elapsed"]))
+                for function, totals in self._functions.items()
+            }
+
+        for totals in functions.values():
+            elapsed = totals.pop("elapsed")
+            totals.update(
+                mean=sum(elapsed) / len(elapsed),
+                p50=_percentile(elapsed, 50),
+                p95=_percentile(elapsed, 95),
+                p99=_percentile(elapsed, 99),
+                max=elapsed[-1],
+            )
+        return functions
+
+    def reset(self) -> None:
+        with self._lock:
+            self._functions.clear()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudgetWarning(UserWarning):
+    pass
+
+
+class QueryBudget:
+    """
+    Statements sent to the database while a crud.query_budget block is open.
+
+    Statements are grouped by fingerprint, their SQL with literals, bound
+    parameters and IN lists normalised, so an N+1 pattern shows up as one
+    fingerprint repeated once per row.
+    """
+
+    def __init__(self, max_queries: int):
+        if max_queries < 0:
+            raise ValueError("max_queries must not be negative")
+
+        self.max_queries = max_queries
+        self.statements: List[str] = []
+
+    @property
+    def exceeded(self) -> bool:
+        return len(self.statements) > self.max_queries
+
+    def fingerprints(self) -> Counter:
+        return Counter(_fingerprint(statement) for statement in self.statements)
+
+    def report(self) -> str:
+        lines = [
+            f"query budget of {self.max_queries} exceeded: "
+            f"{len(self.statements)} statements"
+        ]
+        for fingerprint, count in self.fingerprints().most_common():
+            lines.append(f"  {count} x {fingerprint}")
+        return "\n".join(lines)
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%s|\$\d+|:\w+")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def _fingerprint(statement: str) -> str:
+    statement = " ".join(statement.split())
+    statement = _LITERALS.sub("?", statement)
+    return _IN_LISTS.sub("(?)", statement)
+
+
+def _percentile(ordered: list, percent: float) -> float:
+    # nearest-rank, so the result is always an observed latency
+    rank = -(-len(ordered) * percent // 100)
+    return ordered[max(int(rank), 1) - 1]
@@ -0,0 +1,377 @@
+import base64
+import csv
+import datetime
+import decimal
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Type
+
+import sqlalchemy
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from sqlalchemy_crud import crud
+
+_FORMATS = ("csv", "jsonl", "parquet")
+
+# set in each pool process by _start_worker
+_worker_engine: Optional[Engine] = None
+
+
+class BatchError(NamedTuple):
+    batch: int
+    worker: int
+    rows: int
+    error: str
+
+
+class IngestReport:
+    """
+    Outcome of parallel_create_models.
+
+    workers maps each worker's process id to the rows it inserted; a failed
+    batch is rolled back on its own and listed in errors, the other batches
+    are still inserted.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self.workers: Dict[int, int] = {}
+        self.errors: List[BatchError] = []
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def _add(self, batch: int, worker: int, rows: int, error: Optional[str]) -> None:
+        self.workers.setdefault(worker, 0)
+        if error is None:
+            self.created += rows
+            self.workers[worker] += rows
+        else:
+            self.failed += rows
+            self.errors.append(BatchError(batch, worker, rows, error))
+
+    def __repr__(self) -> str:
+        return (
+            f"IngestReport(created={self.created}, failed={self.failed}, "
+            f"rows_per_second={self.rows_per_second:.1f}, errors={len(self.errors)})"
+        )
+
+
+def export_models(
+    engine: Engine,
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    path: str,
+    format: str = "csv",
+    workers: int = 4,
+    columns: Optional[List[str]] = None,
+    chunk_size: int = 10000,
+) -> int:
+    # the table is split into primary key ranges that are read concurrently,
+    # each on its own pooled connection and as plain rows rather than ORM
+    # instances; every range streams into a part file next to the target,
+    # and the parts are joined in key order once all of them are done
+    if format not in _FORMATS:
+        raise ValueError(f"format must be one of {', '.join(_FORMATS)}")
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+
+    keys = columns or list(crud.get_registry().get(model).columns)
+    statement = sqlalchemy.select(
+        *[column.label(key) for key, column in zip(keys, crud._columns(model, keys))]
+    ).order_by(*crud._primary_key(model))
+    write = _WRITERS[format](keys, crud._columns(model, keys))
+
+    partitions = _partitions(engine, model, workers)
+    directory = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        parts = [os.path.join(directory, str(n)) for n in range(len(partitions))]
+        jobs = [
+            (engine, statement.where(*criteria), part, write, chunk_size)
+            for criteria, part in zip(partitions, parts)
+        ]
+
+        if isinstance(engine.pool, sqlalchemy.pool.SingletonThreadPool):
+            # one connection per thread would mean one database per thread,
+            # e.g. for in-memory SQLite, so the ranges are read in turn
+            exported = sum(_export_partition(*job) for job in jobs)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_export_partition, *job) for job in jobs]
+                exported = sum(future.result() for future in futures)
+
+        _JOINERS[format](keys, parts, path)
+    finally:
+        shutil.rmtree(directory)
+
+    return exported
+
+
+def parallel_create_models(
+    engine_factory: Callable[[], Engine],
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    schemas: Iterable[dict],
+    workers: int = 4,
+    batch_size: int = 1000,
+) -> IngestReport:
+    # batches are handed to a process pool as the source is read, with at most
+    # two per worker in flight, so the source is never held in memory; each
+    # process builds its own engine once and inserts through create_models.
+    # engine_factory and model must be importable (picklable) by the workers
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+
+    report = IngestReport()
+    batches = enumerate(crud._chunked(schemas, batch_size))
+    start = time.perf_counter()
+
+    engine = engine_factory()
+    if _serial(engine, workers):
+        try:
+            for batch, chunk in batches:
+                report._add(batch, *_insert_batch(engine, model, chunk))
+        finally:
+            engine.dispose()
+    else:
+        engine.dispose()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_start_worker, initargs=(engine_factory,)
+        ) as pool:
+            pending = {}
+            for batch, chunk in batches:
+                if len(pending) >= workers * 2:
+                    done = wait(pending, return_when=FIRST_COMPLETED).done
+                    _collect(pending, report, done)
+                pending[pool.submit(_insert_batch, None, model, chunk)] = batch
+            _collect(pending, report, wait(pending).done)
+
+    report.errors.sort()
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def _serial(engine: Engine, workers: int) -> bool:
+    # SQLite takes one writer at a time (and an in-memory database cannot be
+    # shared at all), so its batches are inserted in-process, in source order
+    return workers == 1 or engine.dialect.name == "sqlite"
+
+
+def _start_worker(engine_factory: Callable[[], Engine]) -> None:
+    global _worker_engine
+    _worker_engine = engine_factory()
+
+
+def _insert_batch(
+    engine: Optional[Engine],
+    model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta],
+    schemas: List[dict],
+) -> tuple:
+    # errors go back as text, since driver exceptions do not always pickle
+    with Session(bind=engine or _worker_engine) as db:
+        try:
+            crud.create_models(db, model, schemas, batch_size=len(schemas))
+        except Exception as exc:
+            db.rollback()
+            return os.getpid(), len(schemas), f"{type(exc).__name__}: {exc}"
+    return os.getpid(), len(schemas), None
+
+
+def _collect(pending: dict, report: IngestReport, done: set) -> None:
+    for future in done:
+        report._add(pending.pop(future), *future.result())
+
+
+def _partitions(
+    engine: Engine, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta], workers: int
+) -> List[tuple]:
+    primary_key = crud._primary_key(model)
+    if workers == 1 or len(primary_key) > 1 or not _is_integer(primary_key[0]):
+        return [()]
+
+    column = primary_key[0]
+    with engine.connect() as connection:
+        low, high = connection.execute(
+            sqlalchemy.select(sqlalchemy.func.min(column), sqlalchemy.func.max(column))
+        ).one()
+    if low is None:
+        return [()]
+
+    # more ranges than workers, so a sparse range does not leave a worker idle
+    count = min(workers * 4, high - low + 1)
+    bounds = [low + (high - low + 1) * n // count for n in range(count)] + [high + 1]
+    return [(column >= start, column < end) for start, end in zip(bounds, bounds[1:])]
+
+
+def _is_integer(column: sqlalchemy.Column) -> bool:
+    try:
+        return issubclass(column.type.python_type, int)
+    except NotImplementedError:
+        return False
+
+
+def _export_partition(
+    engine: Engine,
+    statement: sqlalchemy.sql.Select,
+    path: str,
+    write: Callable,
+    chunk_size: int,
+) -> int:
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=chunk_size
+        ).execute(statement)
+        return write(path, result.partitions(chunk_size))
+
+
+def _csv_writer(keys: List[str], columns: List[sqlalchemy.Column]) -> Callable:
+    def write(path, chunks):
+        exported = 0
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            for rows in chunks:
+                writer.writerows(rows)
+                exported += len(rows)
+        return exported
+
+    return write
+
+
+def _jsonl_writer(keys: List[str], columns: List[sqlalchemy.Column]) -> Callable:
+    def write(path, chunks):
+        exported = 0
+        with open(path, "w", encoding="utf-8") as file:
+            for rows in chunks:
+                for row in rows:
+                    file.write(json.dumps(dict(zip(keys, row)), default=_json_value))
+                    file.write("\n")
+                exported += len(rows)
+        return exported
+
+    return write
+
+
+def _parquet_writer(keys: List[str], columns: List[sqlalchemy.Column]) -> Callable:
+    pyarrow, parquet = _import_pyarrow()
+    fields = [_arrow_field(pyarrow, key, column) for key, column in zip(keys, columns)]
+    schema = pyarrow.schema([field for field, _ in fields])
+
+    def write(path, chunks):
+        exported = 0
+        with parquet.ParquetWriter(path, schema) as writer:
+            for rows in chunks:
+                arrays = [
+                    pyarrow.array([convert(row[n]) for row in rows], field.type)
+                    for n, (field, convert) in enumerate(fields)
+                ]
+                writer.write_batch(pyarrow.record_batch(arrays, schema=schema))
+                exported += len(rows)
+        return exported
+
+    return write
+
+
+def _join_text(header: bool) -> Callable:
+    def join(keys, parts, path):
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            if header:
+                csv.writer(file).writerow(keys)
+            for part in parts:
+                with open(part, newline="", encoding="utf-8") as source:
+                    shutil.copyfileobj(source, file)
+
+    return join
+
+
+def _join_parquet(keys: List[str], parts: List[str], path: str) -> None:
+    _, parquet = _import_pyarrow()
+    schema = parquet.read_schema(parts[0])
+    with parquet.ParquetWriter(path, schema) as writer:
+        for part in parts:
+            source = parquet.ParquetFile(part)
+            # copied one row group at a time, so memory stays at one chunk
+            for group in range(source.num_row_groups):
+                writer.write_table(source.read_row_group(group))
+
+
+_WRITERS = {"csv": _csv_writer, "jsonl": _jsonl_writer, "parquet": _parquet_writer}
+_JOINERS = {
+    "csv": _join_text(True),
+    "jsonl": _join_text(False),
+    "parquet": _join_parquet,
+}
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"{type(value).__name__} values cannot be exported as JSON")
+
+
+def _import_pyarrow() -> tuple:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError("exporting to parquet requires pyarrow") from exc
+    return pyarrow, pyarrow.parquet
+
+
+def _arrow_field(pyarrow, key: str, column: sqlalchemy.Column) -> Tuple:
+    # the schema comes from the column types rather than the data, so every
+    # part file agrees on it even when a range holds only NULLs
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+
+    if python_type is bool:
+        arrow_type = pyarrow.bool_()
+    elif python_type is int:
+        arrow_type = pyarrow.int64()
+    elif python_type is float:
+        arrow_type = pyarrow.float64()
+    elif python_type is datetime.datetime:
+        timezone = "UTC" if getattr(column.type, "timezone", False) else None
+        arrow_type = pyarrow.timestamp("us", tz=timezone)
+    elif python_type is datetime.date:
+        arrow_type = pyarrow.date32()
+    elif python_type is datetime.time:
+        arrow_type = pyarrow.time64("us")
+    elif python_type is bytes:
+        arrow_type = pyarrow.binary()
+    elif python_type is str:
+        arrow_type = pyarrow.string()
+    else:
+        # decimals, uuids, JSON and anything else are written as text
+        return pyarrow.field(key, pyarrow.string()), _text_value
+
+    return pyarrow.field(key, arrow_type), _same_value
+
+
+def _same_value(value):
+    return value
+
+
+def _text_value(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_value)
+    return str(value)
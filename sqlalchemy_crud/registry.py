@@ -0,0 +1,141 @@
+import threading
+from typing import Dict, List, Optional, Tuple, Type
+
+import sqlalchemy
+
+
+class ModelInfo:
+    """
+    Mapper facts the crud functions need about one model, gathered once.
+
+    columns maps attribute names to their table columns and column_keys maps
+    every mapped column back to its attribute name; relationships, the
+    association tables behind them and the version column are resolved up
+    front, so no call has to inspect the mapper again.
+    """
+
+    __slots__ = (
+        "model",
+        "mapper",
+        "table_name",
+        "columns",
+        "column_keys",
+        "attributes",
+        "primary_key",
+        "primary_key_keys",
+        "relationships",
+        "secondaries",
+        "refreshable",
+        "updated_by_database",
+        "version",
+    )
+
+    def __init__(self, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta]):
+        mapper = sqlalchemy.inspect(model)
+        self.model = model
+        self.mapper = mapper
+        self.table_name = model.__table__.fullname
+
+        self.columns: Dict[str, sqlalchemy.Column] = {
+            attr.key: attr.columns[0] for attr in mapper.column_attrs
+        }
+        self.column_keys: Dict[sqlalchemy.Column, str] = {
+            column: attr.key for attr in mapper.column_attrs for column in attr.columns
+        }
+        # everything the ORM instruments, hybrids and relationships included
+        self.attributes = frozenset(mapper.all_orm_descriptors.keys())
+
+        self.primary_key: Tuple[sqlalchemy.Column, ...] = tuple(mapper.primary_key)
+        self.primary_key_keys = tuple(
+            self.column_keys[column] for column in self.primary_key
+        )
+
+        self.relationships: Dict[str, sqlalchemy.orm.RelationshipProperty] = dict(
+            mapper.relationships.items()
+        )
+        # (association table, local column, association column) for every
+        # writable many-to-many relationship, each association column once
+        self.secondaries: List[tuple] = []
+        seen = set()
+        for relationship in self.relationships.values():
+            if relationship.secondary is None or relationship.viewonly:
+                continue
+            for local_column, secondary_column in relationship.synchronize_pairs:
+                if secondary_column not in seen:
+                    seen.add(secondary_column)
+                    self.secondaries.append(
+                        (relationship.secondary, local_column, secondary_column)
+                    )
+
+        self.refreshable = tuple(
+            attr.key for attr in mapper.column_attrs if not attr.deferred
+        )
+        self.updated_by_database = tuple(
+            key
+            for key, column in self.columns.items()
+            if column.onupdate is not None or column.server_onupdate is not None
+        )
+        self.version: Optional[sqlalchemy.Column] = mapper.version_id_col
+
+    @property
+    def version_key(self) -> Optional[str]:
+        return None if self.version is None else self.column_keys[self.version]
+
+    def column(self, attribute: str) -> sqlalchemy.Column:
+        try:
+            return self.columns[attribute]
+        except KeyError:
+            raise AttributeError(attribute) from None
+
+    def relationship(self, attribute: str) -> sqlalchemy.orm.RelationshipProperty:
+        try:
+            return self.relationships[attribute]
+        except KeyError:
+            raise AttributeError(attribute) from None
+
+    def __repr__(self) -> str:
+        return f"ModelInfo({self.model.__name__})"
+
+
+class CrudRegistry:
+    """
+    ModelInfo for every model the crud functions have seen.
+
+    Models are registered on first use; register them up front (once all of
+    them are defined, so their relationships resolve) to move that cost to
+    startup.
+    """
+
+    def __init__(self):
+        self._models: Dict[type, ModelInfo] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self, *models: Type[sqlalchemy.orm.decl_api.DeclarativeMeta]
+    ) -> List[ModelInfo]:
+        infos = [ModelInfo(model) for model in models]
+        with self._lock:
+            for info in infos:
+                # a version column set with crud.set_version_column survives
+                # registering the model again
+                previous = self._models.get(info.model)
+                if previous is not None:
+                    info.version = previous.version
+                self._models[info.model] = info
+        return infos
+
+    def get(self, model: Type[sqlalchemy.orm.decl_api.DeclarativeMeta]) -> ModelInfo:
+        info = self._models.get(model)
+        if info is None:
+            with self._lock:
+                info = self._models.get(model)
+                if info is None:
+                    info = self._models[model] = ModelInfo(model)
+        return info
+
+    def __contains__(self, model) -> bool:
+        return model in self._models
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
@@ -41,3 +41,13 @@ class Child(Base):
     parents = relationship(
         "Parent", secondary="parents_to_children", back_populates="children"
     )
+
+
+class Document(Base):
+    __tablename__ = "documents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String(255), nullable=False)
+    version = Column(Integer, nullable=False)
+
+    __mapper_args__ = {"version_id_col": version}
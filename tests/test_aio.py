@@ -0,0 +1,219 @@
+import unittest
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from sqlalchemy_crud import aio, crud
+from tests.models_for_test import Base, Parent, Child
+
+
+class TestAio(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # create an in-memory SQLite database for testing
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+        self.db = AsyncSession(self.engine, expire_on_commit=False)
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        await self.engine.dispose()
+
+    async def create_test_data(self):
+        await aio.create_models(
+            self.db,
+            Parent,
+            schemas=[
+                dict(name=f"parent_test_name_{i}", id_modulo=i % 10)
+                for i in range(1, 101)
+            ],
+        )
+        await aio.create_models(
+            self.db,
+            Child,
+            schemas=[dict(name=f"child_test_name_{j}") for j in range(1, 201)],
+        )
+
+    async def test_get_models(self):
+        await self.create_test_data()
+
+        models = await aio.get_models(self.db, Parent, offset=50, limit=10)
+        self.assertEqual(len(models), 10)
+        self.assertEqual(models[0].name, "parent_test_name_51")
+
+        models = await aio.get_models_by_attribute(
+            self.db, Parent, attribute="id_modulo", attribute_value=0
+        )
+        self.assertEqual(len(models), 10)
+        self.assertEqual(models[-1].name, "parent_test_name_100")
+
+        models, after = await aio.get_models_page(self.db, Parent, limit=60)
+        models, after = await aio.get_models_page(
+            self.db, Parent, after=after, limit=60
+        )
+        self.assertEqual(len(models), 40)
+        self.assertEqual(after, None)
+
+    async def test_get_model(self):
+        await self.create_test_data()
+
+        model = await aio.get_model(self.db, Parent, model_id=7)
+        self.assertEqual(model.name, "parent_test_name_7")
+
+        model = await aio.get_model_by_attribute(
+            self.db, Parent, attribute="name", attribute_value="parent_test_name_8"
+        )
+        self.assertEqual(model.id, 8)
+
+        models = await aio.get_models_by_ids(self.db, Parent, model_ids=[9, 1000])
+        self.assertEqual(models[0].name, "parent_test_name_9")
+        self.assertEqual(models[1], None)
+
+        with self.assertRaises(AttributeError):
+            await aio.get_model_by_attribute(
+                self.db, Parent, attribute="invalid", attribute_value=1
+            )
+
+    async def test_iter_models(self):
+        await self.create_test_data()
+
+        names = [
+            model.name
+            async for model in aio.iter_models(self.db, Parent, chunk_size=30)
+        ]
+        self.assertEqual(names, [f"parent_test_name_{i}" for i in range(1, 101)])
+        self.assertEqual(len(self.db.identity_map), 0)
+
+        models = [
+            model
+            async for model in aio.iter_models(
+                self.db, Parent, attribute="id_modulo", attribute_value=2
+            )
+        ]
+        self.assertEqual(len(models), 10)
+
+    async def test_create_update_delete(self):
+        model = await aio.create_model(self.db, Parent, schema=dict(name="parent"))
+        self.assertEqual(model.id, 1)
+
+        model = await aio.update_model(
+            self.db, Parent, model_id=1, schema=dict(name="parent_updated")
+        )
+        self.assertEqual(model.name, "parent_updated")
+
+        model = await aio.update_model_by_attribute(
+            self.db,
+            Parent,
+            lookup_attribute="name",
+            lookup_attribute_value="parent_updated",
+            schema=dict(id_modulo=3),
+        )
+        self.assertEqual(model.id_modulo, 3)
+
+        await aio.delete_model(self.db, Parent, model_id=1)
+        self.assertEqual(await aio.get_model(self.db, Parent, model_id=1), None)
+
+    async def test_bulk_writes(self):
+        await self.create_test_data()
+
+        updated = await aio.update_models(
+            self.db, Parent, model_ids=[1, 2, 3], schema=dict(id_modulo=42)
+        )
+        self.assertEqual(updated, 3)
+
+        updated = await aio.update_models_by_attribute(
+            self.db,
+            Parent,
+            attribute="id_modulo",
+            attribute_value=42,
+            schema=dict(name="bulk"),
+        )
+        self.assertEqual(updated, 3)
+
+        deleted = await aio.delete_models_by_attribute(
+            self.db, Parent, attribute="name", attribute_value="bulk"
+        )
+        self.assertEqual(deleted, 3)
+
+        deleted = await aio.delete_models(self.db, Parent, model_ids=[4, 5])
+        self.assertEqual(deleted, 2)
+
+    async def test_link_and_unlink_models(self):
+        await self.create_test_data()
+
+        await aio.link_models(
+            self.db,
+            parent_model=Parent,
+            parent_id=1,
+            child_model=Child,
+            child_id=1,
+            backref="children",
+        )
+        await aio.link_models(
+            self.db,
+            parent_model=Parent,
+            parent_id=1,
+            child_model=Child,
+            child_id=2,
+            backref="children",
+        )
+        await aio.unlink_models(
+            self.db,
+            parent_model=Parent,
+            parent_id=1,
+            child_model=Child,
+            child_id=1,
+            backref="children",
+        )
+
+        parent = await self.db.get(
+            Parent, 1, options=[selectinload(Parent.children)], populate_existing=True
+        )
+        self.assertEqual([child.id for child in parent.children], [2])
+
+    async def test_unit_of_work(self):
+        await self.create_test_data()
+
+        with self.assertRaises(AttributeError):
+            async with aio.unit_of_work(self.db):
+                await aio.update_model(
+                    self.db, Parent, model_id=1, schema=dict(name="renamed")
+                )
+                await aio.update_model(
+                    self.db, Parent, model_id=2, schema=dict(invalid=1)
+                )
+
+        model = await aio.get_model(self.db, Parent, model_id=1)
+        self.assertEqual(model.name, "parent_test_name_1")
+
+        async with aio.unit_of_work(self.db):
+            await aio.update_model(
+                self.db, Parent, model_id=1, schema=dict(name="renamed")
+            )
+            await aio.delete_model(self.db, Parent, model_id=2)
+
+        self.assertEqual(self.db.in_transaction(), False)
+        model = await aio.get_model(self.db, Parent, model_id=1)
+        self.assertEqual(model.name, "renamed")
+
+    async def test_instrumentation(self):
+        await self.create_test_data()
+
+        records = []
+        crud.add_listener(records.append)
+        try:
+            await aio.update_model(
+                self.db, Parent, model_id=1, schema=dict(name="renamed")
+            )
+        finally:
+            crud.remove_listener(records.append)
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].function, "update_model")
+        self.assertEqual(records[0].statements, 3)
+        self.assertEqual(records[0].commits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
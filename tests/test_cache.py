@@ -0,0 +1,168 @@
+import time
+import unittest
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_crud import crud
+from sqlalchemy_crud.cache import LRUCache
+from tests.models_for_test import Base, Parent, Child
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_and_set(self):
+        cache = LRUCache(maxsize=2)
+        self.assertEqual(cache.get("a"), None)
+
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+
+        cache.delete("a")
+        self.assertEqual(cache.get("a"), None)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=0.01)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+
+        time.sleep(0.02)
+        self.assertEqual(cache.get("a"), None)
+
+    def test_invalid_maxsize(self):
+        with self.assertRaises(ValueError):
+            LRUCache(maxsize=0)
+
+
+class TestReadThroughCache(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.session = sessionmaker(bind=self.engine)
+        self.db = self.session()
+        Base.metadata.create_all(self.engine)
+
+        for i in range(1, 11):
+            self.db.add(Parent(name=f"parent_test_name_{i}", id_modulo=i % 10))
+        self.db.add(Child(name="child_test_name_1"))
+        self.db.commit()
+
+        self.cache = LRUCache()
+        crud.set_cache(self.cache)
+
+        self.statements = []
+        sqlalchemy.event.listen(
+            self.engine,
+            "before_cursor_execute",
+            lambda *args: self.statements.append(args[2]),
+        )
+
+    def tearDown(self):
+        crud.set_cache(None)
+        Base.metadata.drop_all(self.engine)
+
+    def test_get_model_by_attribute_hits_cache(self):
+        model = crud.get_model_by_attribute(
+            self.db, Parent, attribute="name", attribute_value="parent_test_name_3"
+        )
+        self.assertEqual(model.id, 3)
+        self.assertEqual(len(self.statements), 1)
+
+        other_db = self.session()
+        model = crud.get_model_by_attribute(
+            other_db, Parent, attribute="name", attribute_value="parent_test_name_3"
+        )
+        self.assertEqual(model.id, 3)
+        self.assertEqual(model.id_modulo, 3)
+        self.assertIn(model, other_db)
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_get_model_hits_cache(self):
+        crud.get_model(self.db, Parent, model_id=4)
+        self.db.close()
+
+        model = crud.get_model(self.session(), Parent, model_id=4)
+        self.assertEqual(model.name, "parent_test_name_4")
+        self.assertEqual(len(self.statements), 1)
+
+    def test_misses_are_not_cached(self):
+        self.assertEqual(crud.get_model(self.db, Parent, model_id=11), None)
+        self.assertEqual(crud.get_model(self.db, Parent, model_id=11), None)
+        self.assertEqual(len(self.statements), 2)
+
+    def test_uncommitted_changes_are_not_cached(self):
+        model = crud.get_model(self.db, Parent, model_id=1)
+        model.name = "uncommitted"
+        # the lookup autoflushes the change before it reads the row
+        crud.get_model_by_attribute(
+            self.db, Parent, attribute="name", attribute_value="uncommitted"
+        )
+        self.db.rollback()
+
+        model = crud.get_model_by_attribute(
+            self.session(), Parent, attribute="name", attribute_value="uncommitted"
+        )
+        self.assertIsNone(model)
+        model = crud.get_model(self.session(), Parent, model_id=1)
+        self.assertEqual(model.name, "parent_test_name_1")
+
+        # once the transaction has ended, reads are cached again
+        crud.get_model_by_attribute(
+            self.db, Parent, attribute="name", attribute_value="parent_test_name_2"
+        )
+        hits = self.cache.stats()["hits"]
+        crud.get_model_by_attribute(
+            self.session(),
+            Parent,
+            attribute="name",
+            attribute_value="parent_test_name_2",
+        )
+        self.assertEqual(self.cache.stats()["hits"], hits + 1)
+
+    def test_writes_invalidate(self):
+        crud.get_model(self.db, Parent, model_id=5)
+        crud.update_model(
+            self.db, Parent, model_id=5, schema=dict(name="parent_updated")
+        )
+        self.db.close()
+
+        hits = self.cache.stats()["hits"]
+        model = crud.get_model(self.session(), Parent, model_id=5)
+        self.assertEqual(model.name, "parent_updated")
+        self.assertEqual(self.cache.stats()["hits"], hits)
+
+        crud.get_model(self.session(), Parent, model_id=5)
+        self.assertEqual(self.cache.stats()["hits"], hits + 1)
+
+        crud.link_models(
+            self.db,
+            parent_model=Parent,
+            parent_id=5,
+            child_model=Child,
+            child_id=1,
+            backref="children",
+        )
+        hits = self.cache.stats()["hits"]
+        crud.get_model(self.session(), Parent, model_id=5)
+        self.assertEqual(self.cache.stats()["hits"], hits)
+
+        crud.delete_model(self.db, Parent, model_id=5)
+        self.assertEqual(crud.get_model(self.session(), Parent, model_id=5), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
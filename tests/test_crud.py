@@ -1,22 +1,43 @@
 import unittest
+from unittest import mock
 
 import pytest
+import sqlalchemy
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import sessionmaker
 
+from sqlalchemy_crud import crud
 from sqlalchemy_crud.crud import (
     get_models,
     get_model,
     get_model_by_attribute,
+    get_models_by_ids,
     get_models_by_attribute,
+    get_models_page,
+    count_models,
+    exists_model,
+    iter_models,
+    get_models_by_attribute_page,
     create_model,
+    create_models,
+    upsert_models,
     update_model,
+    update_models,
+    update_models_by_attribute,
     delete_model,
+    delete_models,
+    delete_models_by_attribute,
     link_models,
+    link_many,
     unlink_models,
+    unlink_many,
     update_model_by_attribute,
+    unit_of_work,
+    set_version_column,
+    VersionConflictError,
 )
-from tests.models_for_test import Base, Parent, Child
+from tests.models_for_test import Base, Parent, Child, Document, parents_to_children
 
 
 class TestGetModels(unittest.TestCase):
@@ -82,6 +103,106 @@ class TestGetModels(unittest.TestCase):
         self.assertEqual(models[0].name, "parent_test_name_51")
         self.assertEqual(models[-1].name, "parent_test_name_60")
 
+    def test_get_models_with_filters(self):
+        self.create_test_data()
+
+        models = get_models(
+            self.db,
+            Parent,
+            filters={"id_modulo__in": [1, 2], "id__gte": 50, "name__like": "%_1"},
+        )
+        self.assertEqual([model.id for model in models], [51, 61, 71, 81, 91])
+
+        models = get_models(
+            self.db,
+            Parent,
+            filters={"id_modulo": 0, "id__ne": 10, "name__isnull": False},
+            order_by="-id",
+            limit=3,
+        )
+        self.assertEqual([model.id for model in models], [100, 90, 80])
+
+        models = get_models(
+            self.db,
+            Parent,
+            filters={"id__lt": 30},
+            order_by=["-id_modulo", "name"],
+            limit=4,
+        )
+        self.assertEqual([model.id for model in models], [19, 29, 9, 18])
+
+        with self.assertRaises(AttributeError):
+            get_models(self.db, Parent, filters={"invalid__gt": 1})
+
+        with self.assertRaises(AttributeError):
+            get_models(self.db, Parent, order_by="-invalid")
+
+    def test_get_models_page_and_iter_models_with_filters(self):
+        self.create_test_data()
+
+        models, after = get_models_page(
+            self.db, Parent, filters={"id_modulo__notin": [0, 1]}, limit=75
+        )
+        self.assertEqual(len(models), 75)
+        models, after = get_models_page(
+            self.db,
+            Parent,
+            filters={"id_modulo__notin": [0, 1]},
+            after=after,
+            limit=75,
+        )
+        self.assertEqual(len(models), 5)
+
+        models = list(
+            iter_models(self.db, Parent, filters={"id__lte": 3}, chunk_size=2)
+        )
+        self.assertEqual([model.id for model in models], [1, 2, 3])
+
+    def test_count_models(self):
+        self.create_test_data()
+
+        self.assertEqual(count_models(self.db, Parent), 100)
+        self.assertEqual(count_models(self.db, Parent, filters={"id_modulo": 3}), 10)
+        self.assertEqual(count_models(self.db, Parent, filters={"id__gt": 100}), 0)
+
+    def test_exists_model(self):
+        self.assertFalse(exists_model(self.db, Parent))
+        self.create_test_data()
+
+        self.assertTrue(exists_model(self.db, Parent))
+        self.assertTrue(exists_model(self.db, Parent, filters={"id": 100}))
+        self.assertFalse(exists_model(self.db, Parent, filters={"id": 101}))
+        self.assertEqual(len(self.db.identity_map), 0)
+
+    def test_get_models_with_count(self):
+        self.create_test_data()
+
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        models, total = get_models(
+            self.db,
+            Parent,
+            filters={"id_modulo": 3},
+            offset=2,
+            limit=5,
+            with_count=True,
+        )
+        self.assertEqual(total, 10)
+        self.assertEqual([model.id for model in models], [23, 33, 43, 53, 63])
+        self.assertEqual(len(statements), 1)
+
+        models, total = get_models(self.db, Parent, offset=500, with_count=True)
+        self.assertEqual((models, total), ([], 100))
+
+        rows, total = get_models(
+            self.db, Parent, columns=["id"], limit=2, with_count=True
+        )
+        self.assertEqual(([row.id for row in rows], total), ([1, 2], 100))
+
     def test_get_models_with_relationship(self):
         self.create_test_data()
         self.link_children_to_parents()
@@ -98,6 +219,131 @@ class TestGetModels(unittest.TestCase):
         self.assertEqual(models[0].children[0].name, "child_test_name_101")
         self.assertEqual(models[0].children[1].name, "child_test_name_102")
 
+    def test_get_models_as_rows(self):
+        self.create_test_data()
+        self.db.expunge_all()
+
+        rows = get_models(self.db, Parent, limit=2, as_="dict")
+        self.assertEqual(
+            list(rows[0]), ["id", "name", "id_modulo", "created", "updated"]
+        )
+        self.assertEqual(rows[1]["name"], "parent_test_name_2")
+
+        rows = get_models(self.db, Parent, columns=["id", "name"], limit=2, as_="tuple")
+        self.assertEqual(rows, [(1, "parent_test_name_1"), (2, "parent_test_name_2")])
+        self.assertIs(type(rows[0]), tuple)
+
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        rows, total = get_models(
+            self.db, Parent, filters={"id_modulo": 1}, as_="namedtuple", with_count=True
+        )
+        self.assertEqual(
+            (rows[0].id, rows[0].name, total), (1, "parent_test_name_1", 10)
+        )
+        self.assertEqual(len(rows[0]), 5)
+        rows, total = get_models(
+            self.db, Parent, columns=["id"], limit=2, as_="dict", with_count=True
+        )
+        self.assertEqual((rows, total), ([{"id": 1}, {"id": 2}], 100))
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(
+            get_models(self.db, Parent, offset=500, as_="tuple", with_count=True),
+            ([], 100),
+        )
+
+        rows = get_models_by_attribute(
+            self.db, Parent, attribute="id_modulo", attribute_value=3, as_="dict"
+        )
+        self.assertEqual([row["id"] for row in rows], list(range(3, 100, 10)))
+
+        row = get_model_by_attribute(
+            self.db, Parent, attribute="id", attribute_value=7, as_="tuple"
+        )
+        self.assertEqual(row[:3], (7, "parent_test_name_7", 7))
+        self.assertEqual(
+            get_model_by_attribute(
+                self.db, Parent, attribute="id", attribute_value=700, as_="dict"
+            ),
+            None,
+        )
+        self.assertEqual(len(self.db.identity_map), 0)
+
+        with self.assertRaises(ValueError):
+            get_models(self.db, Parent, as_="list")
+
+        with self.assertRaises(ValueError):
+            get_models(self.db, Parent, as_="dict", eager=["children"])
+
+    def test_get_models_with_columns(self):
+        self.create_test_data()
+
+        rows = get_models(self.db, Parent, columns=["id", "name"], limit=5)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(tuple(rows[0]), (1, "parent_test_name_1"))
+        self.assertEqual(rows[4].name, "parent_test_name_5")
+        self.assertEqual(len(self.db.identity_map), 0)
+
+        rows = get_models_by_attribute(
+            self.db, Parent, attribute="id_modulo", attribute_value=3, columns=["id"]
+        )
+        self.assertEqual([row.id for row in rows], list(range(3, 100, 10)))
+
+        row = get_model_by_attribute(
+            self.db,
+            Parent,
+            attribute="name",
+            attribute_value="parent_test_name_7",
+            columns=["id_modulo"],
+        )
+        self.assertEqual(tuple(row), (7,))
+
+        with self.assertRaises(AttributeError):
+            get_models(self.db, Parent, columns=["children"])
+
+        with self.assertRaises(ValueError):
+            get_models(self.db, Parent, columns=["id"], eager=["children"])
+
+    def test_get_models_with_eager(self):
+        self.create_test_data()
+        self.link_children_to_parents()
+        self.db.expunge_all()
+
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        models = get_models(self.db, Parent, eager=["children.parents"])
+        names = [child.name for model in models for child in model.children]
+        parents = [
+            parent.id for child in models[0].children for parent in child.parents
+        ]
+        self.assertEqual(len(names), 200)
+        self.assertEqual(parents, [1, 1])
+        self.assertEqual(len(statements), 3)
+
+        model = get_model(self.db, Parent, model_id=1, eager=["children"])
+        self.assertEqual(len(model.children), 2)
+
+        models = get_models_by_attribute(
+            self.db,
+            Parent,
+            attribute="id_modulo",
+            attribute_value=1,
+            eager=["children"],
+        )
+        self.assertEqual(len(models[0].children), 2)
+
+        with self.assertRaises(AttributeError):
+            get_models(self.db, Parent, eager=["name"])
+
     def test_get_model(self):
         self.create_test_data()
 
@@ -110,6 +356,19 @@ class TestGetModels(unittest.TestCase):
         model = get_model(self.db, Parent, model_id=101)
         self.assertEqual(model, None)
 
+    def test_get_model_uses_identity_map(self):
+        self.create_test_data()
+        model = get_model(db=self.db, model=Parent, model_id=5)
+
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        self.assertIs(get_model(db=self.db, model=Parent, model_id=5), model)
+        self.assertEqual(statements, [])
+
     def test_get_model_with_relationship(self):
         self.create_test_data()
         self.link_children_to_parents()
@@ -131,6 +390,42 @@ class TestGetModels(unittest.TestCase):
         model = get_model(db=self.db, model=Parent, model_id=101)
         self.assertEqual(model, None)
 
+    def test_get_models_by_ids(self):
+        self.create_test_data()
+
+        models = get_models_by_ids(
+            self.db, Parent, model_ids=[42, 1000, 7, 42, 3], chunk_size=2
+        )
+        self.assertEqual(
+            [model.name if model else None for model in models],
+            [
+                "parent_test_name_42",
+                None,
+                "parent_test_name_7",
+                "parent_test_name_42",
+                "parent_test_name_3",
+            ],
+        )
+
+        models = get_models_by_ids(self.db, Parent, model_ids=[3, 1000], as_dict=True)
+        self.assertEqual(list(models), [3])
+        self.assertEqual(models[3].name, "parent_test_name_3")
+
+    def test_get_models_by_ids_uses_identity_map(self):
+        self.create_test_data()
+        loaded = get_models_by_ids(self.db, Parent, model_ids=range(1, 11))
+
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        models = get_models_by_ids(self.db, Parent, model_ids=range(1, 12))
+        self.assertEqual(models[:10], loaded)
+        self.assertEqual(models[10].name, "parent_test_name_11")
+        self.assertEqual(len(statements), 1)
+
     def test_get_model_by_attribute(self):
         self.create_test_data()
         self.link_children_to_parents()
@@ -206,6 +501,44 @@ class TestGetModels(unittest.TestCase):
         self.assertEqual(models[0].children[0].name, "child_test_name_17")
         self.assertEqual(models[-1].children[0].name, "child_test_name_197")
 
+    def test_get_models_by_attribute_without_limit(self):
+        self.create_test_data()
+
+        models = get_models_by_attribute(
+            self.db, Parent, attribute="name", attribute_value="x", limit=None
+        )
+        self.assertEqual(models, [])
+
+        for i in range(1, 201):
+            self.db.add(Parent(name=f"extra_{i}", id_modulo=0))
+        self.db.commit()
+        models = get_models_by_attribute(
+            self.db, Parent, attribute="id_modulo", attribute_value=0, limit=None
+        )
+        self.assertEqual(len(models), 210)
+        models = get_models_by_attribute(
+            self.db,
+            Parent,
+            attribute="id_modulo",
+            attribute_value=0,
+            offset=200,
+            limit=None,
+        )
+        self.assertEqual(len(models), 10)
+
+    def test_get_models_by_attribute_reuses_statements(self):
+        self.create_test_data()
+        get_models_by_attribute(
+            db=self.db, model=Parent, attribute="id_modulo", attribute_value=0
+        )
+
+        hits = crud._attribute_statement.cache_info().hits
+        models = get_models_by_attribute(
+            db=self.db, model=Parent, attribute="id_modulo", attribute_value=1
+        )
+        self.assertEqual(crud._attribute_statement.cache_info().hits, hits + 1)
+        self.assertEqual(models[0].name, "parent_test_name_1")
+
     def test_get_models_by_attribute_with_invalid_attribute(self):
         self.create_test_data()
         self.link_children_to_parents()
@@ -218,6 +551,129 @@ class TestGetModels(unittest.TestCase):
                 attribute_value="parent_test_name_1",
             )
 
+    def test_get_models_page(self):
+        self.create_test_data()
+
+        names, after, pages = [], None, 0
+        while True:
+            models, after = get_models_page(self.db, Parent, after=after, limit=30)
+            names.extend(model.name for model in models)
+            pages += 1
+            if after is None:
+                break
+
+        self.assertEqual(pages, 4)
+        self.assertEqual(names, [f"parent_test_name_{i}" for i in range(1, 101)])
+
+    def test_get_models_page_with_order_by(self):
+        self.create_test_data()
+
+        models, after = get_models_page(
+            self.db, Parent, limit=15, order_by="-id_modulo"
+        )
+        self.assertEqual([model.id_modulo for model in models], [9] * 10 + [8] * 5)
+        self.assertEqual(models[0].name, "parent_test_name_99")
+
+        models, after = get_models_page(
+            self.db, Parent, after=after, limit=15, order_by="-id_modulo"
+        )
+        self.assertEqual([model.id_modulo for model in models], [8] * 5 + [7] * 10)
+        self.assertEqual(models[0].name, "parent_test_name_48")
+
+        with self.assertRaises(AttributeError):
+            get_models_page(self.db, Parent, order_by="invalid_attribute")
+
+        with self.assertRaises(ValueError):
+            get_models_page(self.db, Parent, after="not-a-cursor")
+
+    def test_get_models_page_with_server_default_order_by(self):
+        self.create_test_data()
+
+        for order_by, expected in (
+            ("created", list(range(1, 101))),
+            ("-created", list(range(100, 0, -1))),
+        ):
+            ids, after, pages = [], None, 0
+            while pages < 10:
+                models, after = get_models_page(
+                    self.db, Parent, after=after, limit=30, order_by=order_by
+                )
+                ids.extend(model.id for model in models)
+                pages += 1
+                if after is None:
+                    break
+
+            # every row shares one server-generated timestamp
+            self.assertEqual(len({model.created for model in models}), 1)
+            self.assertEqual(pages, 4)
+            self.assertEqual(ids, expected)
+
+    def test_get_models_page_with_string_order_by(self):
+        self.create_test_data()
+
+        models, after = get_models_page(self.db, Parent, limit=60, order_by="name")
+        self.assertEqual(len(models), 60)
+        self.assertEqual(models[0].name, "parent_test_name_1")
+        self.assertEqual(models[2].name, "parent_test_name_100")
+
+        models, after = get_models_page(
+            self.db, Parent, after=after, limit=60, order_by="name"
+        )
+        self.assertEqual(len(models), 40)
+        self.assertEqual(models[-1].name, "parent_test_name_99")
+        self.assertEqual(after, None)
+
+    def test_get_models_by_attribute_page(self):
+        self.create_test_data()
+
+        models, after = get_models_by_attribute_page(
+            self.db, Parent, attribute="id_modulo", attribute_value=3, limit=6
+        )
+        self.assertEqual(models[0].name, "parent_test_name_3")
+        self.assertEqual(models[-1].name, "parent_test_name_53")
+
+        models, after = get_models_by_attribute_page(
+            self.db,
+            Parent,
+            attribute="id_modulo",
+            attribute_value=3,
+            after=after,
+            limit=6,
+        )
+        self.assertEqual(len(models), 4)
+        self.assertEqual(models[-1].name, "parent_test_name_93")
+        self.assertEqual(after, None)
+
+    def test_iter_models(self):
+        self.create_test_data()
+
+        names = []
+        for model in iter_models(self.db, Parent, chunk_size=7):
+            names.append(model.name)
+            self.assertTrue(model in self.db)
+            self.assertLessEqual(len(self.db.identity_map), 8)
+
+        self.assertEqual(names, [f"parent_test_name_{i}" for i in range(1, 101)])
+        self.assertEqual(len(self.db.identity_map), 0)
+
+    def test_iter_models_by_attribute(self):
+        self.create_test_data()
+
+        models = list(
+            iter_models(
+                self.db,
+                Parent,
+                attribute="id_modulo",
+                attribute_value=5,
+                chunk_size=5,
+            )
+        )
+        self.assertEqual(len(models), 10)
+        self.assertEqual(models[-1].name, "parent_test_name_95")
+
+        with self.assertRaises(AttributeError):
+            list(iter_models(self.db, Parent, attribute="invalid", attribute_value=1))
+
     def test_create_model(self):
         model = create_model(
             db=self.db,
@@ -243,6 +699,29 @@ class TestGetModels(unittest.TestCase):
         self.assertEqual(model_check.name, "parent_test_name_2")
         self.assertEqual(model_check.id, 2)
 
+    def test_create_model_skips_refresh(self):
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        model = create_model(self.db, Parent, schema=dict(name="parent", id_modulo=1))
+        self.assertEqual((model.id, model.name, model.id_modulo), (1, "parent", 1))
+        self.assertEqual(len(statements), 1)
+
+        # server defaults the flush did not return load together on access
+        self.assertIsNotNone(model.created)
+        self.assertIsNotNone(model.updated)
+        self.assertEqual(len(statements), 2)
+
+        model = create_model(self.db, Parent, schema=dict(name="other"), refresh=True)
+        self.assertEqual(len(statements), 4)
+        self.db.close()
+        self.assertIsNotNone(model.created)
+        self.assertEqual(model.id_modulo, None)
+
     def test_create_model_raise_exception_on_invalid_attribute(self):
         with self.assertRaises(TypeError):
             create_model(
@@ -251,6 +730,165 @@ class TestGetModels(unittest.TestCase):
                 schema=dict(name="parent_test_name_1", id_modulo=1, invalid=1),
             )
 
+    def test_create_models(self):
+        created = create_models(
+            db=self.db,
+            model=Parent,
+            schemas=(
+                dict(name=f"parent_test_name_{i}", id_modulo=i % 10)
+                for i in range(1, 251)
+            ),
+            batch_size=100,
+        )
+        self.assertEqual(created, 250)
+        self.assertEqual(self.db.query(Parent).count(), 250)
+
+        model = get_model(db=self.db, model=Parent, model_id=250)
+        self.assertEqual(model.name, "parent_test_name_250")
+        self.assertEqual(model.id_modulo, 0)
+
+    def test_create_models_return_objects(self):
+        models = create_models(
+            db=self.db,
+            model=Child,
+            schemas=[dict(name=f"child_test_name_{j}") for j in range(1, 6)],
+            batch_size=2,
+            return_objects=True,
+        )
+        self.assertEqual(len(models), 5)
+        self.assertEqual([model.id for model in models], [1, 2, 3, 4, 5])
+        self.assertEqual(models[-1].name, "child_test_name_5")
+        self.assertIsNotNone(models[0].created)
+
+    def test_create_models_with_mixed_keys(self):
+        created = create_models(
+            self.db,
+            Parent,
+            [
+                dict(name="parent_1"),
+                dict(name="parent_2", id_modulo=3),
+                dict(id_modulo=4, name="parent_3"),
+            ],
+        )
+        self.assertEqual(created, 3)
+        self.assertEqual(
+            [(model.name, model.id_modulo) for model in get_models(self.db, Parent)],
+            [("parent_1", None), ("parent_2", 3), ("parent_3", 4)],
+        )
+
+        models = create_models(
+            self.db,
+            Parent,
+            [dict(name="parent_4", id_modulo=5), dict(name="parent_5")],
+            return_objects=True,
+        )
+        self.assertEqual(
+            [(model.name, model.id_modulo) for model in models],
+            [("parent_4", 5), ("parent_5", None)],
+        )
+
+    def test_create_models_raise_exception_on_invalid_attribute(self):
+        with self.assertRaises(TypeError):
+            create_models(
+                db=self.db,
+                model=Parent,
+                schemas=[dict(name="parent_test_name_1", id_modulo=1, invalid=1)],
+            )
+
+    def test_upsert_models(self):
+        self.create_test_data()
+
+        upserted = upsert_models(
+            db=self.db,
+            model=Parent,
+            schemas=[
+                dict(id=1, name="parent_upserted_1", id_modulo=11),
+                dict(id=101, name="parent_test_name_101", id_modulo=1),
+                dict(id=2, name="parent_upserted_2", id_modulo=12),
+            ],
+            conflict_on=["id"],
+            batch_size=2,
+        )
+        self.assertEqual(upserted, 3)
+        self.assertEqual(self.db.query(Parent).count(), 101)
+        self.assertEqual(get_model(self.db, Parent, 1).name, "parent_upserted_1")
+        self.assertEqual(get_model(self.db, Parent, 2).id_modulo, 12)
+        self.assertEqual(get_model(self.db, Parent, 101).name, "parent_test_name_101")
+
+    def test_upsert_models_with_mixed_keys(self):
+        self.create_test_data()
+
+        upsert_models(
+            db=self.db,
+            model=Parent,
+            schemas=[
+                dict(id=1, name="parent_upserted_1"),
+                dict(id=101, name="parent_test_name_101", id_modulo=7),
+                dict(id=2, id_modulo=12, name="parent_upserted_2"),
+            ],
+            conflict_on=["id"],
+        )
+        self.assertEqual(get_model(self.db, Parent, 1).id_modulo, 1)
+        self.assertEqual(get_model(self.db, Parent, 2).id_modulo, 12)
+        self.assertEqual(get_model(self.db, Parent, 101).id_modulo, 7)
+
+    def test_upsert_models_with_update_fields(self):
+        self.create_test_data()
+
+        upsert_models(
+            db=self.db,
+            model=Parent,
+            schemas=[dict(id=1, name="parent_upserted_1", id_modulo=11)],
+            conflict_on=["id"],
+            update_fields=["id_modulo"],
+        )
+        model = get_model(self.db, Parent, 1)
+        self.assertEqual(model.name, "parent_test_name_1")
+        self.assertEqual(model.id_modulo, 11)
+
+        upsert_models(
+            db=self.db,
+            model=Parent,
+            schemas=[dict(id=1, name="parent_upserted_1", id_modulo=12)],
+            conflict_on=["id"],
+            update_fields=[],
+        )
+        self.assertEqual(get_model(self.db, Parent, 1).id_modulo, 11)
+
+        with self.assertRaises(AttributeError):
+            upsert_models(
+                db=self.db,
+                model=Parent,
+                schemas=[dict(id=1, name="parent_upserted_1")],
+                conflict_on=["invalid"],
+            )
+
+    def test_upsert_statement_without_update_fields_on_mysql(self):
+        table = Parent.__table__
+        statement = crud._upsert_statement("mysql", table, [table.c.name], [])
+        sql = str(statement.compile(dialect=mysql.dialect()))
+        # a no-op update rather than INSERT IGNORE, which hides bad data too
+        self.assertNotIn("IGNORE", sql)
+        self.assertTrue(sql.endswith("ON DUPLICATE KEY UPDATE id = parent_1.id"))
+
+    def test_upsert_models_generic_fallback(self):
+        self.create_test_data()
+
+        with mock.patch.object(self.db.bind.dialect, "name", "generic"):
+            upserted = upsert_models(
+                db=self.db,
+                model=Parent,
+                schemas=[
+                    dict(id=1, name="parent_upserted_1", id_modulo=11),
+                    dict(id=101, name="parent_test_name_101", id_modulo=1),
+                    dict(id=1, name="parent_upserted_1_again", id_modulo=11),
+                ],
+                conflict_on=["id"],
+            )
+        self.assertEqual(upserted, 3)
+        self.assertEqual(self.db.query(Parent).count(), 101)
+        self.assertEqual(get_model(self.db, Parent, 1).name, "parent_upserted_1_again")
+
     def test_update_model(self):
         self.create_test_data()
         self.link_children_to_parents()
@@ -269,6 +907,174 @@ class TestGetModels(unittest.TestCase):
         model = get_model(db=self.db, model=Parent, model_id=1)
         self.assertEqual(model.name, "parent_test_name_1_updated")
 
+        model = update_model(
+            db=self.db, model=Parent, model_id=2, schema=dict(id_modulo=5), refresh=True
+        )
+        self.db.close()
+        self.assertEqual((model.name, model.id_modulo), ("parent_test_name_2", 5))
+        self.assertIsNotNone(model.updated)
+
+    def test_update_model_skips_unchanged(self):
+        self.create_test_data()
+        get_model(self.db, Parent, model_id=1)
+
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        with mock.patch.object(self.db, "commit", wraps=self.db.commit) as commit:
+            model, changed = update_model(
+                self.db,
+                Parent,
+                model_id=1,
+                schema=dict(name="parent_test_name_1", id_modulo=1),
+                with_changed=True,
+            )
+            self.assertEqual((model.id, changed), (1, False))
+            commit.assert_not_called()
+
+            model, changed = update_model_by_attribute(
+                self.db,
+                Parent,
+                lookup_attribute="name",
+                lookup_attribute_value="parent_test_name_1",
+                schema=dict(name="parent_test_name_1", id_modulo=11),
+                with_changed=True,
+            )
+            self.assertEqual((model.id_modulo, changed), (11, True))
+            commit.assert_called_once()
+
+        updates = [s for s in statements if s.startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("id_modulo=?", updates[0])
+        self.assertNotIn("name=?", updates[0])
+
+        # other pending work in the session is still committed
+        self.db.add(Child(name="pending"))
+        update_model(self.db, Parent, model_id=1, schema=dict(id_modulo=11))
+        self.assertEqual(len(self.db.new), 0)
+        self.assertEqual(count_models(self.db, Child, {"name": "pending"}), 1)
+
+    def test_update_model_with_expected_version(self):
+        document = create_model(self.db, Document, dict(title="draft"))
+        self.assertEqual(document.version, 1)
+
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        model = update_model(
+            self.db, Document, model_id=1, schema=dict(title="v2"), expected_version=1
+        )
+        self.assertIs(model, document)
+        self.assertEqual((model.title, model.version), ("v2", 2))
+        # one conditional UPDATE, no read before or after it
+        self.assertEqual(len(statements), 1)
+        self.assertIn(
+            "WHERE documents.id IN (?) AND documents.version = ?", statements[0]
+        )
+
+        with self.assertRaises(VersionConflictError):
+            update_model(
+                self.db,
+                Document,
+                model_id=1,
+                schema=dict(title="v3"),
+                expected_version=1,
+            )
+        with self.assertRaises(VersionConflictError):
+            update_model_by_attribute(
+                self.db,
+                Document,
+                lookup_attribute="title",
+                lookup_attribute_value="v2",
+                schema=dict(title="v3"),
+                expected_version=1,
+            )
+        self.db.expunge_all()
+        self.assertEqual(get_model(self.db, Document, model_id=1).title, "v2")
+
+        model, changed = update_model_by_attribute(
+            self.db,
+            Document,
+            lookup_attribute="title",
+            lookup_attribute_value="v2",
+            schema=dict(title="v3"),
+            expected_version=2,
+            with_changed=True,
+        )
+        self.assertEqual((model.title, model.version, changed), ("v3", 3, True))
+
+    def test_update_model_version_id_col_conflict(self):
+        create_model(self.db, Document, dict(title="draft"))
+        model = get_model(self.db, Document, model_id=1)
+        self.db.query(Document).update(
+            dict(version=Document.version + 1), synchronize_session=False
+        )
+
+        # the mapper's own version check on flush is reported the same way
+        with self.assertRaises(VersionConflictError):
+            update_model(self.db, Document, model_id=1, schema=dict(title="v2"))
+        self.db.rollback()
+
+        with self.assertRaises(VersionConflictError):
+            delete_model(self.db, Document, model_id=1, expected_version=2)
+        delete_model(self.db, Document, model_id=1, expected_version=1)
+        self.assertNotIn(model, self.db)
+        self.assertEqual(count_models(self.db, Document), 0)
+
+    def test_set_version_column(self):
+        self.create_test_data()
+        with self.assertRaises(ValueError):
+            update_model(
+                self.db, Parent, model_id=1, schema=dict(name="x"), expected_version=1
+            )
+
+        set_version_column(Parent, "id_modulo")
+        crud.get_registry().register(Parent)
+        try:
+            model = update_model(
+                self.db, Parent, model_id=1, schema=dict(name="x"), expected_version=1
+            )
+            self.assertEqual((model.name, model.id_modulo), ("x", 2))
+            with self.assertRaises(VersionConflictError):
+                delete_model(self.db, Parent, model_id=1, expected_version=1)
+        finally:
+            set_version_column(Parent, None)
+
+        with self.assertRaises(AttributeError):
+            set_version_column(Parent, "invalid")
+        with self.assertRaises(ValueError):
+            set_version_column(Parent, "updated")
+
+    def test_bulk_updates_bump_the_version(self):
+        for title in ("a", "b", "c"):
+            create_model(self.db, Document, dict(title=title))
+
+        self.assertEqual(update_models(self.db, Document, [1, 2], dict(title="x")), 2)
+        self.assertEqual(
+            update_models_by_attribute(self.db, Document, "id", 3, dict(title="y")), 1
+        )
+        self.assertEqual(
+            [model.version for model in get_models(self.db, Document)], [2, 2, 2]
+        )
+
+        # a writer still holding version 1 no longer overwrites the bulk write
+        for model_id in (1, 3):
+            with self.assertRaises(VersionConflictError):
+                update_model(
+                    self.db,
+                    Document,
+                    model_id=model_id,
+                    schema=dict(title="stale"),
+                    expected_version=1,
+                )
+
     def test_update_model_raise_exception_on_invalid_attribute(self):
         with self.assertRaises(AttributeError):
             update_model(
@@ -319,6 +1125,89 @@ class TestGetModels(unittest.TestCase):
         model = get_model(db=self.db, model=Parent, model_id=1)
         self.assertEqual(model, None)
 
+    def test_update_models(self):
+        self.create_test_data()
+
+        updated = update_models(
+            db=self.db,
+            model=Parent,
+            model_ids=range(1, 51),
+            schema=dict(id_modulo=42),
+            chunk_size=7,
+        )
+        self.assertEqual(updated, 50)
+        self.assertEqual(
+            self.db.query(Parent).filter(Parent.id_modulo == 42).count(), 50
+        )
+
+        model = get_model(db=self.db, model=Parent, model_id=50)
+        self.assertEqual(model.id_modulo, 42)
+
+    def test_update_models_by_attribute(self):
+        self.create_test_data()
+
+        model = get_model(db=self.db, model=Parent, model_id=10)
+        self.assertEqual(model.name, "parent_test_name_10")
+
+        updated = update_models_by_attribute(
+            db=self.db,
+            model=Parent,
+            attribute="id_modulo",
+            attribute_value=0,
+            schema=dict(name="renamed"),
+        )
+        self.assertEqual(updated, 10)
+        self.assertEqual(model.name, "renamed")
+
+    def test_update_models_by_attribute_raise_exception_on_invalid_attribute(self):
+        with self.assertRaises(AttributeError):
+            update_models_by_attribute(
+                db=self.db,
+                model=Parent,
+                attribute="id_modulo",
+                attribute_value=0,
+                schema=dict(invalid=1),
+            )
+
+        with self.assertRaises(AttributeError):
+            update_models_by_attribute(
+                db=self.db,
+                model=Parent,
+                attribute="invalid",
+                attribute_value=0,
+                schema=dict(name="renamed"),
+            )
+
+    def test_delete_models(self):
+        self.create_test_data()
+        self.link_children_to_parents()
+
+        deleted = delete_models(
+            db=self.db, model=Parent, model_ids=[1, 2, 3, 1000], chunk_size=2
+        )
+        self.assertEqual(deleted, 3)
+        self.assertEqual(self.db.query(Parent).count(), 97)
+        self.assertEqual(get_model(db=self.db, model=Parent, model_id=1), None)
+
+        child = get_model(db=self.db, model=Child, model_id=1)
+        self.assertEqual(child.parents, [])
+
+    def test_delete_models_by_attribute(self):
+        self.create_test_data()
+        self.link_children_to_parents()
+
+        deleted = delete_models_by_attribute(
+            db=self.db, model=Parent, attribute="id_modulo", attribute_value=1
+        )
+        self.assertEqual(deleted, 10)
+        self.assertEqual(self.db.query(Parent).count(), 90)
+        self.assertEqual(
+            self.db.query(parents_to_children)
+            .filter(parents_to_children.c.parent_id == 11)
+            .count(),
+            0,
+        )
+
     def test_link_models(self):
         """
         Test linking models
@@ -479,6 +1368,242 @@ class TestGetModels(unittest.TestCase):
                 backref="children",
             )
 
+    def test_link_many(self):
+        self.create_test_data()
+        self.link_children_to_parents()
+
+        parent = get_model(db=self.db, model=Parent, model_id=1)
+        self.assertEqual(len(parent.children), 2)
+        child = get_model(db=self.db, model=Child, model_id=10)
+        self.assertEqual(child.parents[0].id, 5)
+
+        linked = link_many(
+            db=self.db,
+            parent_model=Parent,
+            parent_id=1,
+            child_model=Child,
+            child_ids=[1, 2, 10, 11, 12, 12],
+            backref="children",
+            chunk_size=2,
+        )
+        self.assertEqual(linked, 3)
+        self.assertEqual(
+            sorted(child.id for child in parent.children), [1, 2, 10, 11, 12]
+        )
+        self.assertEqual(sorted(parent.id for parent in child.parents), [1, 5])
+
+    def test_link_many_does_not_load_collection(self):
+        self.create_test_data()
+        self.link_children_to_parents()
+        parent = get_model(db=self.db, model=Parent, model_id=1)
+
+        statements = []
+        sqlalchemy.event.listen(
+            self.db.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        link_many(
+            db=self.db,
+            parent_model=Parent,
+            parent_id=1,
+            child_model=Child,
+            child_ids=range(3, 13),
+            backref="children",
+        )
+        # the parent check, one existence check for the chunk and the insert;
+        # the collection itself is not loaded
+        self.assertEqual(len(statements), 3)
+        self.assertFalse(
+            any("FROM children, parents_to_children" in s for s in statements)
+        )
+        self.assertEqual(len(parent.children), 12)
+
+    def test_link_many_raise_exception_on_invalid_backref(self):
+        with self.assertRaises(AttributeError):
+            link_many(
+                db=self.db,
+                parent_model=Parent,
+                parent_id=1,
+                child_model=Child,
+                child_ids=[1],
+                backref="invalid",
+            )
+
+        with self.assertRaises(ValueError):
+            link_many(
+                db=self.db,
+                parent_model=Parent,
+                parent_id=1,
+                child_model=Parent,
+                child_ids=[1],
+                backref="children",
+            )
+
+    def test_link_many_raise_exception_on_invalid_ids(self):
+        self.create_test_data()
+
+        with self.assertRaises(AttributeError):
+            link_many(
+                db=self.db,
+                parent_model=Parent,
+                parent_id=1000,
+                child_model=Child,
+                child_ids=[1],
+                backref="children",
+            )
+
+        with self.assertRaises(AttributeError):
+            link_many(
+                db=self.db,
+                parent_model=Parent,
+                parent_id=1,
+                child_model=Child,
+                child_ids=[1, 2, 1000],
+                backref="children",
+                chunk_size=2,
+            )
+        self.db.rollback()
+        self.assertEqual(
+            self.db.execute(sqlalchemy.select(parents_to_children)).all(), []
+        )
+
+    def test_unlink_many(self):
+        self.create_test_data()
+        self.link_children_to_parents()
+
+        parent = get_model(db=self.db, model=Parent, model_id=2)
+        self.assertEqual(len(parent.children), 2)
+
+        unlinked = unlink_many(
+            db=self.db,
+            parent_model=Parent,
+            parent_id=2,
+            child_model=Child,
+            child_ids=[3, 4, 5],
+            backref="children",
+        )
+        self.assertEqual(unlinked, 2)
+        self.assertEqual(parent.children, [])
+
+    def test_unit_of_work_commits_once(self):
+        self.create_test_data()
+
+        commits = []
+        sqlalchemy.event.listen(
+            self.db, "after_commit", lambda session: commits.append(session)
+        )
+
+        with unit_of_work(self.db):
+            parent = create_model(
+                db=self.db, model=Parent, schema=dict(name="parent_uow")
+            )
+            update_model(
+                db=self.db, model=Parent, model_id=1, schema=dict(name="renamed")
+            )
+            link_models(
+                db=self.db,
+                parent_model=Parent,
+                parent_id=parent.id,
+                child_model=Child,
+                child_id=1,
+                backref="children",
+            )
+            delete_model(db=self.db, model=Parent, model_id=2)
+            self.assertEqual(commits, [])
+
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(
+            get_model(db=self.db, model=Parent, model_id=1).name, "renamed"
+        )
+        self.assertEqual(get_model(db=self.db, model=Parent, model_id=2), None)
+        self.assertEqual(len(parent.children), 1)
+
+
+class TestUnitOfWork(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        # pysqlite defers BEGIN until the first write, which breaks the
+        # savepoints nested blocks use; SQLAlchemy's documented workaround
+        sqlalchemy.event.listen(
+            engine,
+            "connect",
+            lambda connection, record: setattr(connection, "isolation_level", None),
+        )
+        sqlalchemy.event.listen(
+            engine, "begin", lambda connection: connection.exec_driver_sql("BEGIN")
+        )
+        self.db = sessionmaker(bind=engine)()
+        Base.metadata.create_all(engine)
+        create_models(
+            self.db,
+            Parent,
+            [
+                dict(name=f"parent_test_name_{i}", id_modulo=i % 10)
+                for i in range(1, 11)
+            ],
+        )
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(self.db.bind)
+
+    def test_unit_of_work_rolls_back_on_exception(self):
+        with self.assertRaises(AttributeError):
+            with unit_of_work(self.db):
+                with unit_of_work(self.db):
+                    update_model(
+                        db=self.db,
+                        model=Parent,
+                        model_id=1,
+                        schema=dict(name="renamed"),
+                    )
+                update_model(
+                    db=self.db, model=Parent, model_id=2, schema=dict(invalid=1)
+                )
+
+        model = get_model(db=self.db, model=Parent, model_id=1)
+        self.assertEqual(model.name, "parent_test_name_1")
+
+    def test_failed_nested_block_is_rolled_back(self):
+        with unit_of_work(self.db):
+            create_model(self.db, Parent, dict(name="kept"))
+            try:
+                with unit_of_work(self.db):
+                    create_model(self.db, Parent, dict(name="discarded"))
+                    update_model(self.db, Parent, model_id=1, schema=dict(name="x"))
+                    raise KeyError
+            except KeyError:
+                pass
+            self.assertEqual(
+                get_model(self.db, Parent, model_id=1).name, "parent_test_name_1"
+            )
+
+        self.assertEqual(count_models(self.db, Parent, {"name": "kept"}), 1)
+        self.assertEqual(count_models(self.db, Parent, {"name": "discarded"}), 0)
+        self.assertEqual(
+            get_model(self.db, Parent, model_id=1).name, "parent_test_name_1"
+        )
+
+    def test_bulk_writes_keep_the_session_current(self):
+        parents = get_models(self.db, Parent)
+        with unit_of_work(self.db):
+            update_models(self.db, Parent, model_ids=[1, 2], schema=dict(name="bulk"))
+            self.assertEqual(get_model(self.db, Parent, model_id=1).name, "bulk")
+
+            delete_models(self.db, Parent, model_ids=[3])
+            self.assertIsNone(get_model(self.db, Parent, model_id=3))
+
+            upsert_models(
+                self.db, Parent, [dict(id=4, name="upserted")], conflict_on=["id"]
+            )
+            self.assertEqual(parents[3].name, "upserted")
+
+            update_model(self.db, Parent, model_id=2, schema=dict(id_modulo=0))
+
+        self.assertEqual(count_models(self.db, Parent, {"name": "bulk"}), 2)
+        self.assertEqual(count_models(self.db, Parent), 9)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,208 @@
+import unittest
+import warnings
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_crud import crud
+from sqlalchemy_crud.instrumentation import (
+    CallRecord,
+    QueryBudgetExceeded,
+    QueryBudgetWarning,
+    StatsCollector,
+)
+from tests.models_for_test import Base, Parent, Child
+
+
+class TestStatsCollector(unittest.TestCase):
+    def test_aggregates_per_function(self):
+        stats = StatsCollector()
+        for i in range(1, 101):
+            record = CallRecord("get_model", Parent)
+            record.elapsed = i / 1000
+            record.statements = 1
+            record.rows = 1
+            stats(record)
+
+        record = CallRecord("update_model", Parent)
+        record.commits = 1
+        record.error = AttributeError()
+        stats(record)
+
+        get_model = stats.stats()["get_model"]
+        self.assertEqual(get_model["calls"], 100)
+        self.assertEqual(get_model["statements"], 100)
+        self.assertEqual(get_model["p50"], 0.05)
+        self.assertEqual(get_model["p95"], 0.095)
+        self.assertEqual(get_model["p99"], 0.099)
+        self.assertEqual(get_model["max"], 0.1)
+        self.assertAlmostEqual(get_model["mean"], 0.0505)
+
+        update_model = stats.stats()["update_model"]
+        self.assertEqual(update_model["errors"], 1)
+        self.assertEqual(update_model["commits"], 1)
+
+        stats.reset()
+        self.assertEqual(stats.stats(), {})
+
+    def test_window(self):
+        stats = StatsCollector(window=2)
+        for elapsed in (3.0, 1.0, 2.0):
+            record = CallRecord("get_models")
+            record.elapsed = elapsed
+            stats(record)
+
+        self.assertEqual(stats.stats()["get_models"]["calls"], 3)
+        self.assertEqual(stats.stats()["get_models"]["max"], 2.0)
+
+        with self.assertRaises(ValueError):
+            StatsCollector(window=0)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.db = sessionmaker(bind=self.engine)()
+        Base.metadata.create_all(self.engine)
+
+        for i in range(1, 11):
+            self.db.add(Parent(name=f"parent_test_name_{i}", id_modulo=i % 10))
+        self.db.add(Child(name="child_test_name_1"))
+        self.db.commit()
+
+        self.records = []
+        crud.add_listener(self.records.append)
+
+    def tearDown(self):
+        crud.remove_listener(self.records.append)
+        Base.metadata.drop_all(self.engine)
+
+    def test_reads(self):
+        crud.get_models(self.db, Parent, limit=4)
+        crud.get_model(self.db, Parent, model_id=99)
+        crud.count_models(self.db, Parent)
+
+        self.assertEqual(
+            [(r.function, r.model, r.statements, r.rows) for r in self.records],
+            [
+                ("get_models", Parent, 1, 4),
+                ("get_model", Parent, 1, 0),
+                ("count_models", Parent, 1, 1),
+            ],
+        )
+        self.assertTrue(all(r.elapsed > 0 for r in self.records))
+
+    def test_writes_report_outermost_call(self):
+        crud.update_model(self.db, Parent, model_id=1, schema=dict(name="renamed"))
+        crud.update_models(self.db, Parent, model_ids=[2, 3], schema=dict(id_modulo=0))
+
+        update_model, update_models = self.records
+        self.assertEqual(update_model.function, "update_model")
+        self.assertEqual(update_model.statements, 2)
+        self.assertEqual(update_model.commits, 1)
+        self.assertEqual(update_model.refreshes, 0)
+        self.assertEqual(update_models.rows, 2)
+        self.assertEqual(update_models.refreshes, 0)
+
+    def test_errors(self):
+        with self.assertRaises(AttributeError):
+            crud.update_model(self.db, Parent, model_id=1, schema=dict(invalid=1))
+
+        self.assertIsInstance(self.records[0].error, AttributeError)
+        self.assertEqual(self.records[0].commits, 0)
+
+    def test_iter_models(self):
+        iterator = crud.iter_models(self.db, Parent, chunk_size=3)
+        for _ in iterator:
+            # queries made by the caller between items are not attributed
+            crud.count_models(self.db, Child)
+
+        count_models = [r for r in self.records if r.function == "count_models"]
+        self.assertEqual(len(count_models), 10)
+        self.assertEqual(self.records[-1].function, "iter_models")
+        self.assertEqual(self.records[-1].rows, 10)
+        self.assertEqual(self.records[-1].statements, 4)
+
+    def test_stats_collector_as_listener(self):
+        stats = StatsCollector()
+        crud.add_listener(stats)
+        try:
+            crud.get_model(self.db, Parent, model_id=1)
+            crud.get_model(self.db, Parent, model_id=2)
+        finally:
+            crud.remove_listener(stats)
+        crud.get_model(self.db, Parent, model_id=3)
+
+        self.assertEqual(stats.stats()["get_model"]["calls"], 2)
+        self.assertEqual(stats.stats()["get_model"]["statements"], 2)
+
+
+class TestQueryBudget(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.db = sessionmaker(bind=self.engine)()
+        Base.metadata.create_all(self.engine)
+
+        crud.create_models(
+            self.db,
+            Parent,
+            [dict(name=f"parent_test_name_{i}", id_modulo=i % 10) for i in range(1, 6)],
+        )
+        crud.create_models(self.db, Child, [dict(name="child_test_name_1")])
+        for i in range(1, 6):
+            crud.link_many(self.db, Parent, i, Child, [1], backref="children")
+        self.db.expunge_all()
+
+    def tearDown(self):
+        Base.metadata.drop_all(self.engine)
+
+    def test_within_budget(self):
+        with crud.query_budget(max_queries=2) as budget:
+            parents = crud.get_models(self.db, Parent, eager=["children"])
+            self.assertEqual([len(parent.children) for parent in parents], [1] * 5)
+        self.assertFalse(budget.exceeded)
+
+    def test_lazy_loads_exceed_budget(self):
+        with self.assertRaises(QueryBudgetExceeded) as context:
+            with crud.query_budget(max_queries=2):
+                for parent in crud.get_models(self.db, Parent):
+                    list(parent.children)
+
+        report = str(context.exception)
+        self.assertIn("query budget of 2 exceeded: 6 statements", report)
+        # the five lazy loads differ only in their parameters
+        self.assertIn("  5 x SELECT children.id", report)
+
+    def test_warn(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            with crud.query_budget(max_queries=0, action="warn"):
+                crud.get_model(self.db, Parent, model_id=1)
+
+        self.assertEqual(len(caught), 1)
+        self.assertIs(caught[0].category, QueryBudgetWarning)
+        self.assertEqual(caught[0].filename, __file__)
+
+    def test_decorator_and_nesting(self):
+        @crud.query_budget(max_queries=1)
+        def two_queries():
+            crud.get_model(self.db, Parent, model_id=1)
+            with crud.query_budget(max_queries=1):
+                crud.get_model(self.db, Parent, model_id=2)
+
+        with self.assertRaises(QueryBudgetExceeded):
+            two_queries()
+
+        with self.assertRaises(ValueError):
+            with crud.query_budget(max_queries=1, action="ignore"):
+                pass
+
+    def test_errors_in_block_are_not_masked(self):
+        with self.assertRaises(KeyError):
+            with crud.query_budget(max_queries=0):
+                crud.get_model(self.db, Parent, model_id=1)
+                raise KeyError
+
+
+if __name__ == "__main__":
+    unittest.main()
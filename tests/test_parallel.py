@@ -0,0 +1,179 @@
+import csv
+import functools
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_crud import crud
+from sqlalchemy_crud.parallel import export_models, parallel_create_models
+from tests.models_for_test import Base, Parent
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class TestExportModels(unittest.TestCase):
+    def setUp(self):
+        # a file-backed database, so the workers get connections of their own
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            f"sqlite:///{os.path.join(self.directory.name, 'test.db')}"
+        )
+        Base.metadata.create_all(self.engine)
+
+        db = sessionmaker(bind=self.engine)()
+        crud.create_models(
+            db,
+            Parent,
+            [
+                dict(name=f"parent_test_name_{i}", id_modulo=i % 10)
+                for i in range(1, 1001)
+            ],
+        )
+        crud.delete_models_by_attribute(db, Parent, "id_modulo", 3)
+        db.close()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_csv(self):
+        exported = export_models(self.engine, Parent, self.path("parents.csv"))
+        self.assertEqual(exported, 900)
+
+        with open(self.path("parents.csv"), newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 900)
+        self.assertEqual(
+            list(rows[0]), ["id", "name", "id_modulo", "created", "updated"]
+        )
+        self.assertEqual(
+            [int(row["id"]) for row in rows], sorted(int(row["id"]) for row in rows)
+        )
+        self.assertEqual(rows[-1]["name"], "parent_test_name_1000")
+
+    def test_jsonl(self):
+        exported = export_models(
+            self.engine,
+            Parent,
+            self.path("parents.jsonl"),
+            format="jsonl",
+            workers=3,
+            columns=["id", "name"],
+            chunk_size=100,
+        )
+        self.assertEqual(exported, 900)
+
+        with open(self.path("parents.jsonl")) as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(rows[0], {"id": 1, "name": "parent_test_name_1"})
+        self.assertEqual([row["id"] for row in rows], sorted(row["id"] for row in rows))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet(self):
+        exported = export_models(
+            self.engine, Parent, self.path("parents.parquet"), format="parquet"
+        )
+        self.assertEqual(exported, 900)
+
+        table = pyarrow.parquet.read_table(self.path("parents.parquet"))
+        self.assertEqual(table.num_rows, 900)
+        self.assertEqual(table.column("id")[0].as_py(), 1)
+        self.assertIsNotNone(table.column("created")[0].as_py())
+
+    def test_empty_table_and_in_memory_database(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.assertEqual(export_models(engine, Parent, self.path("empty.csv")), 0)
+        with open(self.path("empty.csv"), newline="") as file:
+            self.assertEqual(file.read(), "id,name,id_modulo,created,updated\r\n")
+
+        crud.create_models(
+            sessionmaker(bind=engine)(), Parent, [dict(name="parent")] * 10
+        )
+        self.assertEqual(
+            export_models(engine, Parent, self.path("memory.csv"), workers=4), 10
+        )
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            export_models(self.engine, Parent, self.path("parents.xml"), format="xml")
+        with self.assertRaises(ValueError):
+            export_models(self.engine, Parent, self.path("parents.csv"), workers=0)
+        with self.assertRaises(AttributeError):
+            export_models(self.engine, Parent, self.path("parents.csv"), columns=["x"])
+
+
+class TestParallelCreateModels(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.directory.name, 'test.db')}"
+        # a partial of create_engine pickles, so pool workers can call it
+        self.engine_factory = functools.partial(create_engine, url)
+        self.engine = self.engine_factory()
+        Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def schemas(self, count):
+        for i in range(1, count + 1):
+            if i == 250:
+                yield dict(name=f"parent_test_name_{i}", invalid=1)
+            else:
+                yield dict(name=f"parent_test_name_{i}", id_modulo=i % 10)
+
+    def test_sqlite_is_serial_and_ordered(self):
+        report = parallel_create_models(
+            self.engine_factory, Parent, self.schemas(1000), workers=4, batch_size=100
+        )
+
+        self.assertEqual(report.created, 900)
+        self.assertEqual(report.failed, 100)
+        self.assertEqual(list(report.workers), [os.getpid()])
+        self.assertEqual(len(report.errors), 1)
+        self.assertEqual(report.errors[0].batch, 2)
+        self.assertIn("TypeError", report.errors[0].error)
+        self.assertGreater(report.rows_per_second, 0)
+
+        names = [model.name for model in crud.get_models(self.db, Parent, limit=300)]
+        self.assertEqual(
+            names[199:201], ["parent_test_name_200", "parent_test_name_301"]
+        )
+
+    def test_process_pool(self):
+        with mock.patch("sqlalchemy_crud.parallel._serial", return_value=False):
+            report = parallel_create_models(
+                self.engine_factory,
+                Parent,
+                self.schemas(1000),
+                workers=2,
+                batch_size=50,
+            )
+
+        self.assertEqual(report.created, 950)
+        self.assertEqual(sum(report.workers.values()), 950)
+        self.assertNotIn(os.getpid(), report.workers)
+        self.assertEqual([error.batch for error in report.errors], [4])
+        self.assertEqual(crud.count_models(self.db, Parent), 950)
+
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            parallel_create_models(self.engine_factory, Parent, [], workers=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_crud import crud
+from sqlalchemy_crud.registry import CrudRegistry, ModelInfo
+from tests.models_for_test import Base, Parent, Child, Document, parents_to_children
+
+
+class TestModelInfo(unittest.TestCase):
+    def test_introspection(self):
+        info = ModelInfo(Parent)
+
+        self.assertEqual(
+            list(info.columns), ["id", "name", "id_modulo", "created", "updated"]
+        )
+        self.assertIs(info.columns["name"], Parent.__table__.c.name)
+        self.assertEqual(info.column_keys[Parent.__table__.c.id_modulo], "id_modulo")
+        self.assertEqual(info.primary_key_keys, ("id",))
+        self.assertEqual(info.table_name, "parent_1")
+        self.assertIn("children", info.attributes)
+        self.assertEqual(list(info.relationships), ["children"])
+        self.assertEqual(
+            info.secondaries,
+            [
+                (
+                    parents_to_children,
+                    Parent.__table__.c.id,
+                    parents_to_children.c.parent_id,
+                )
+            ],
+        )
+        self.assertEqual(info.updated_by_database, ("updated",))
+        self.assertIsNone(info.version)
+
+        self.assertIs(ModelInfo(Document).version, Document.__table__.c.version)
+        self.assertEqual(ModelInfo(Document).version_key, "version")
+
+        with self.assertRaises(AttributeError):
+            info.column("children")
+        with self.assertRaises(AttributeError):
+            info.relationship("name")
+
+
+class TestCrudRegistry(unittest.TestCase):
+    def test_register_and_get(self):
+        registry = CrudRegistry()
+        parent, child = registry.register(Parent, Child)
+        self.assertIn(Parent, registry)
+        self.assertIs(registry.get(Parent), parent)
+
+        # unregistered models are introspected on first use, once
+        self.assertNotIn(Document, registry)
+        self.assertIs(registry.get(Document), registry.get(Document))
+
+        parent.version = Parent.__table__.c.id_modulo
+        (parent,) = registry.register(Parent)
+        self.assertIs(parent.version, Parent.__table__.c.id_modulo)
+        self.assertEqual(parent.version_key, "id_modulo")
+
+        registry.clear()
+        self.assertNotIn(Parent, registry)
+
+    def test_crud_calls_do_not_inspect_again(self):
+        engine = create_engine("sqlite:///:memory:")
+        db = sessionmaker(bind=engine)()
+        Base.metadata.create_all(engine)
+        crud.get_registry().register(Parent, Child)
+
+        with mock.patch("sqlalchemy.inspect", wraps=sqlalchemy.inspect) as inspect:
+            crud.create_model(db, Parent, dict(name="parent", id_modulo=1))
+            crud.update_model(db, Parent, model_id=1, schema=dict(id_modulo=2))
+            crud.get_models(db, Parent, filters={"id_modulo": 2}, order_by="-name")
+            crud.get_models_by_attribute(db, Parent, "name", "parent", as_="dict")
+            crud.delete_models_by_attribute(db, Parent, "id_modulo", 2)
+
+        self.assertFalse(
+            [call for call in inspect.call_args_list if isinstance(call.args[0], type)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()